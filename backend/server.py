@@ -1,31 +1,332 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, UploadFile, File
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.datastructures import Headers, MutableHeaders
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, IndexModel, InsertOne, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
 import os
+import asyncio
 import logging
+import time
+import base64
+import bisect
+import csv
+import sys
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import jwt
 import hashlib
+import hmac
+import importlib.util
+import bcrypt
+import io
+import re
+import socket
+import numpy as np
+import pandas as pd
+import orjson
+import zlib
+from PIL import Image
+
+try:
+    import brotli
+except ImportError:  # responses are then only gzip-compressed
+    brotli = None
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+except ImportError:  # exports are then CSV-only
+    Workbook = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Metrics and slow-request profiling (SLOW_REQUEST_PROFILE_MS=0 disables the profiler).
+# /api/metrics takes METRICS_TOKEN or an admin login; METRICS_PUBLIC=true opens it to anyone.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', 'false').lower() == 'true'
+SLOW_REQUEST_PROFILE_MS = float(os.environ.get('SLOW_REQUEST_PROFILE_MS', '0'))
+PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
+# ============== METRICS ==============
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+DB_OPS_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+METRIC_DEFS = {
+    "hrms_http_request_duration_seconds": ("histogram", "HTTP request latency by route", LATENCY_BUCKETS),
+    "hrms_http_response_size_bytes": ("histogram", "HTTP response body size by route", SIZE_BUCKETS),
+    "hrms_http_request_db_ops": ("histogram", "Mongo commands issued per HTTP request", DB_OPS_BUCKETS),
+    "hrms_http_request_db_seconds": ("histogram", "Time spent in Mongo commands per HTTP request", LATENCY_BUCKETS),
+    "hrms_mongo_command_duration_seconds": ("histogram", "Mongo command latency by command", LATENCY_BUCKETS),
+    "hrms_mongo_command_failures_total": ("counter", "Failed Mongo commands by command", None),
+    "hrms_payroll_phase_seconds": ("histogram", "Payroll engine phase durations", LATENCY_BUCKETS),
+    "hrms_singleflight_requests_total": ("counter", "Coalesced reads by route; result=leader ran the query, coalesced shared it", None),
+    "hrms_password_hash_seconds": ("histogram", "Time spent hashing or verifying a password", LATENCY_BUCKETS),
+    "hrms_password_hash_wait_seconds": ("histogram", "Time spent waiting for a password hashing thread", LATENCY_BUCKETS),
+}
+
+# Per-request Mongo counters; motor copies the context into its executor threads
+request_stats: ContextVar[Optional[dict]] = ContextVar("request_stats", default=None)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    def __init__(self, definitions: dict):
+        self.definitions = definitions
+        self.histograms = {}
+        self.counters = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, labels: dict, value: float):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.definitions[name][2])
+            histogram.observe(value)
+
+    def inc(self, name: str, labels: dict, value: float = 1):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def render(self, extra: Optional[List[tuple]] = None) -> str:
+        series = defaultdict(list)
+        with self.lock:
+            for (name, labels), histogram in self.histograms.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    series[name].append((f"{name}_bucket", labels + (("le", str(bound)),), cumulative))
+                series[name].append((f"{name}_sum", labels, histogram.sum))
+                series[name].append((f"{name}_count", labels, histogram.count))
+            for (name, labels), value in self.counters.items():
+                series[name].append((name, labels, value))
+        
+        lines = []
+        for name, samples in series.items():
+            kind, help_text, _ = self.definitions[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(format_sample(*sample) for sample in samples)
+        for name, kind, help_text, samples in extra or []:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(format_sample(name, tuple(labels.items()), value) for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+def format_sample(name: str, labels: tuple, value) -> str:
+    if labels:
+        rendered = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels)
+        return f"{name}{{{rendered}}} {value}"
+    return f"{name} {value}"
+
+metrics = MetricsRegistry(METRIC_DEFS)
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        metrics.inc("hrms_mongo_command_failures_total", {"command": event.command_name})
+        self._record(event)
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1e6
+        metrics.observe("hrms_mongo_command_duration_seconds", {"command": event.command_name}, seconds)
+        stats = request_stats.get()
+        if stats is not None:
+            stats["db_ops"] += 1
+            stats["db_seconds"] += seconds
+
+# Samples the event-loop thread's stack so slow requests can be dumped as collapsed stacks
+class StackSampler:
+    def __init__(self, interval: float, max_samples: int = 20000):
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+        self.thread_id = None
+        self._thread = None
+
+    def start(self, thread_id: int):
+        if self._thread is not None:
+            return
+        self.thread_id = thread_id
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None and len(stack) < 64:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).name}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                self.samples.append((time.monotonic(), ";".join(reversed(stack))))
+            time.sleep(self.interval)
+
+    def collapse(self, since: float, until: float) -> dict:
+        stacks = defaultdict(int)
+        for taken_at, stack in list(self.samples):
+            if since <= taken_at <= until:
+                stacks[stack] += 1
+        return stacks
+
+stack_sampler = StackSampler(PROFILE_SAMPLE_INTERVAL) if SLOW_REQUEST_PROFILE_MS > 0 else None
+
+# MongoDB connection pool, timeouts and wire compression (compressors whose module isn't installed are skipped)
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '10000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '10000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '10000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '0'))  # 0 = no timeout
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', 'zstd,snappy,zlib')
+
+# Reporting reads (dashboard, payroll listings, exports); max staleness is -1 (unbounded) or at least 90s
+MONGO_REPORTING_READ_PREFERENCE = os.environ.get('MONGO_REPORTING_READ_PREFERENCE', 'secondaryPreferred')
+MONGO_REPORTING_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_REPORTING_MAX_STALENESS_SECONDS', '90'))
+
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+def available_compressors(names: str) -> List[str]:
+    wanted = [name.strip() for name in names.split(",") if name.strip()]
+    return [name for name in wanted if name in COMPRESSOR_MODULES and importlib.util.find_spec(COMPRESSOR_MODULES[name])]
+
+def reporting_read_preference():
+    mode = MONGO_REPORTING_READ_PREFERENCE
+    if mode == "primary":
+        return Primary()
+    preferences = {
+        "primaryPreferred": PrimaryPreferred,
+        "secondary": Secondary,
+        "secondaryPreferred": SecondaryPreferred,
+        "nearest": Nearest
+    }
+    if mode not in preferences:
+        raise ValueError(f"Unsupported MONGO_REPORTING_READ_PREFERENCE: {mode}")
+    staleness = MONGO_REPORTING_MAX_STALENESS_SECONDS
+    return preferences[mode](max_staleness=staleness if staleness == -1 else max(staleness, 90))
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+mongo_options = {
+    "maxPoolSize": MONGO_MAX_POOL_SIZE,
+    "minPoolSize": MONGO_MIN_POOL_SIZE,
+    "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+    "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+    "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None
+}
+compressors = available_compressors(MONGO_COMPRESSORS)
+if compressors:
+    mongo_options["compressors"] = ",".join(compressors)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandListener()], **mongo_options)
 db = client[os.environ['DB_NAME']]
+# Same database, but reads may be served by a secondary up to the staleness bound. Only for reports:
+# write-then-read paths (check_out, payroll runs) and ETag'd routes, whose validators come from fresh
+# version counters, stay on `db`.
+reporting_db = client.get_database(os.environ['DB_NAME'], read_preference=reporting_read_preference())
 
 # JWT Secret
 JWT_SECRET = "ar_hrms_secret_key_2024"
 security = HTTPBearer(auto_error=False)
 
-app = FastAPI(title="CRM A.R HR System API")
+# Authenticated-principal cache
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', '10000'))
+PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL', '30'))
+# Seconds a stream ticket may be used to open an event stream; the stream itself outlives it
+STREAM_TICKET_TTL = int(os.environ.get('STREAM_TICKET_TTL', '60'))
+
+# Password hashing (bcrypt cost factor, hashing threads, callers allowed to wait for a thread)
+PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_WAITING = int(os.environ.get('PASSWORD_HASH_MAX_WAITING', '200'))
+
+# Bulk employee import (CSV or NDJSON); rows are validated and written a chunk at a time
+EMPLOYEE_IMPORT_CHUNK_SIZE = int(os.environ.get('EMPLOYEE_IMPORT_CHUNK_SIZE', '500'))
+EMPLOYEE_IMPORT_MAX_ROWS = int(os.environ.get('EMPLOYEE_IMPORT_MAX_ROWS', '20000'))
+
+# Dashboard stats are cached briefly; every admin landing page requests them
+DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', '5'))
+
+# Settings are cached per process; without a change stream the version is re-checked this often
+SETTINGS_REVALIDATE_SECONDS = float(os.environ.get('SETTINGS_REVALIDATE_SECONDS', '5'))
+
+# ETag version counters; without a change stream other workers' writes are picked up this often
+VERSION_REVALIDATE_SECONDS = float(os.environ.get('VERSION_REVALIDATE_SECONDS', '5'))
+
+# Profile images
+MEDIA_STORAGE = os.environ.get('MEDIA_STORAGE', 'disk')  # "disk" or "gridfs"
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', ROOT_DIR / 'media'))
+MEDIA_MAX_BYTES = int(os.environ.get('MEDIA_MAX_BYTES', 2 * 1024 * 1024))
+# A small file can still decode to a huge bitmap; checked from the header before any pixel is read
+MEDIA_MAX_PIXELS = int(os.environ.get('MEDIA_MAX_PIXELS', 40_000_000))
+THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE', '160'))
+
+# Pagination
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '1000'))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '5000'))
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '500'))
+
+# Response compression (gzip, or brotli when the package is installed and the client accepts it)
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+
+# Background jobs: each worker runs up to JOB_CONCURRENCY jobs and renews its lease while they run
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', '2'))
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '30'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '2'))
+
+# Live attendance feed (Server-Sent Events)
+ATTENDANCE_STREAM_QUEUE_SIZE = int(os.environ.get('ATTENDANCE_STREAM_QUEUE_SIZE', '256'))
+ATTENDANCE_STREAM_KEEPALIVE_SECONDS = float(os.environ.get('ATTENDANCE_STREAM_KEEPALIVE_SECONDS', '15'))
+
+# Report exports; XLSX files are written here by the job runner
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', ROOT_DIR / 'exports'))
+EXPORT_RETENTION_HOURS = float(os.environ.get('EXPORT_RETENTION_HOURS', '24'))
+
+# Streamed uploads (NDJSON/CSV imports, punch uploads); one line may carry an inline data-URL photo
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 64 * 1024 * 1024))
+UPLOAD_MAX_LINE_BYTES = int(os.environ.get('UPLOAD_MAX_LINE_BYTES', 4 * 1024 * 1024))
+
+# Door-reader punch uploads (NDJSON)
+ATTENDANCE_BULK_MAX_ROWS = int(os.environ.get('ATTENDANCE_BULK_MAX_ROWS', '50000'))
+
+app = FastAPI(title="CRM A.R HR System API", default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # ============== MODELS ==============
@@ -88,6 +389,16 @@ class AttendanceBase(BaseModel):
 class AttendanceCreate(AttendanceBase):
     pass
 
+# One line of a bulk upload: either a full timestamp or a date plus "HH:MM" time
+class AttendancePunch(BaseModel):
+    employee_id: Optional[str] = None
+    employee_code: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    date: Optional[str] = Field(default=None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+    time: Optional[str] = Field(default=None, pattern=r"^([01]\d|2[0-3]):[0-5]\d$")
+    method: str = "Biometric"
+    location: Optional[dict] = None
+
 class Attendance(AttendanceBase):
     id: str
 
@@ -158,10 +469,376 @@ class LeadPermissions(BaseModel):
     lead_id: str
     modules: List[str]
 
+# ============== CACHES ==============
+
+# Bounded LRU cache whose entries expire after `ttl` seconds
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+dashboard_cache = TTLCache(4, DASHBOARD_CACHE_TTL)
+
+# Process-wide copy of the settings document. update_settings bumps its `version`;
+# other workers pick the change up from a change stream, or by re-checking the version.
+class SettingsCache:
+    def __init__(self, revalidate_seconds: float):
+        self.revalidate_seconds = revalidate_seconds
+        self.settings = None
+        self.version = None
+        self.checked_at = 0.0
+        self.watching = False
+        self.loads = 0
+        self.revalidations = 0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        if self.settings is None:
+            return False
+        return self.watching or time.monotonic() - self.checked_at < self.revalidate_seconds
+
+    async def get(self) -> dict:
+        if self._fresh():
+            return self.settings
+        async with self._lock:
+            if self._fresh():
+                return self.settings
+            if self.settings is not None:
+                self.revalidations += 1
+                doc = await db.settings.find_one({"id": "settings"}, {"_id": 0, "version": 1})
+                if (doc or {}).get("version", 0) == self.version:
+                    self.checked_at = time.monotonic()
+                    return self.settings
+            await self.load()
+        return self.settings
+
+    async def load(self):
+        self.loads += 1
+        doc = await db.settings.find_one({"id": "settings"}, {"_id": 0})
+        self.set(doc or {})
+
+    def set(self, doc: dict):
+        self.settings = doc
+        self.version = doc.get("version", 0)
+        self.checked_at = time.monotonic()
+
+    async def watch(self):
+        # Deletes, drops and updates whose document is gone by lookup time carry no fullDocument
+        pipeline = [{"$match": {"$or": [
+            {"fullDocument.id": "settings"},
+            {"operationType": {"$in": ["delete", "drop", "dropDatabase", "rename", "invalidate"]}}
+        ]}}]
+        while True:
+            try:
+                async with db.settings.watch(pipeline, full_document="updateLookup") as stream:
+                    self.watching = True
+                    await self.load()
+                    async for change in stream:
+                        await self.apply_change(change)
+                # An invalidate closes the stream; reopen it
+                self.watching = False
+            except OperationFailure as e:
+                # Change streams need a replica set; fall back to version polling
+                logger.info(f"Settings change stream unavailable, polling instead: {e}")
+                self.watching = False
+                return
+            except PyMongoError as e:
+                logger.warning(f"Settings change stream interrupted: {e}")
+                self.watching = False
+                await asyncio.sleep(self.revalidate_seconds)
+            except Exception:
+                # Never leave a dead watcher behind a cache that still believes it is fresh
+                logger.exception("Settings change stream failed")
+                self.watching = False
+                await asyncio.sleep(self.revalidate_seconds)
+
+    async def apply_change(self, change: dict):
+        doc = change.get("fullDocument")
+        if doc is None:
+            # Re-read instead of guessing; a deleted settings document reads as {}
+            await self.load()
+            return
+        doc.pop("_id", None)
+        self.set(doc)
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "watching": self.watching,
+            "loads": self.loads,
+            "revalidations": self.revalidations
+        }
+
+settings_cache = SettingsCache(SETTINGS_REVALIDATE_SECONDS)
+
+# Write counters per collection ("employees", "lead_permissions", "payroll") that back ETags.
+# Counters only move forward, so a late change-stream event can never roll a fresher value back.
+class VersionCounters:
+    def __init__(self, revalidate_seconds: float):
+        self.revalidate_seconds = revalidate_seconds
+        self.versions = {}
+        self.checked_at = None
+        self.watching = False
+        self.loads = 0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        if self.checked_at is None:
+            return False
+        return self.watching or time.monotonic() - self.checked_at < self.revalidate_seconds
+
+    async def get(self, name: str) -> int:
+        if not self._fresh():
+            async with self._lock:
+                if not self._fresh():
+                    await self.load()
+        return self.versions.get(name, 0)
+
+    async def load(self):
+        self.loads += 1
+        async for doc in db.collection_versions.find({}):
+            self.advance(doc["_id"], doc["version"])
+        self.checked_at = time.monotonic()
+
+    def advance(self, name: str, version: int):
+        self.versions[name] = max(self.versions.get(name, 0), version)
+
+    async def bump(self, *names: str):
+        for name in names:
+            doc = await db.collection_versions.find_one_and_update(
+                {"_id": name},
+                {"$inc": {"version": 1}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self.advance(name, doc["version"])
+
+    async def watch(self):
+        while True:
+            try:
+                async with db.collection_versions.watch(full_document="updateLookup") as stream:
+                    self.watching = True
+                    await self.load()
+                    async for change in stream:
+                        doc = change.get("fullDocument")
+                        if doc:
+                            self.advance(doc["_id"], doc["version"])
+                self.watching = False
+            except OperationFailure as e:
+                logger.info(f"Version change stream unavailable, polling instead: {e}")
+                self.watching = False
+                return
+            except PyMongoError as e:
+                logger.warning(f"Version change stream interrupted: {e}")
+                self.watching = False
+                await asyncio.sleep(self.revalidate_seconds)
+            except Exception:
+                # A dead watcher would leave every ETag trusting counters that no longer move
+                logger.exception("Version change stream failed")
+                self.watching = False
+                await asyncio.sleep(self.revalidate_seconds)
+
+    def stats(self) -> dict:
+        return {"versions": dict(self.versions), "watching": self.watching, "loads": self.loads}
+
+collection_versions = VersionCounters(VERSION_REVALIDATE_SECONDS)
+
+# Identical concurrent reads share one in-flight awaitable. Keys are (route, scope, params), where
+# scope is whatever the result depends on about the caller. Nothing outlives the call, so this is
+# not a cache, and results are shared between callers and must not be mutated.
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+        self.leaders = defaultdict(int)
+        self.coalesced = defaultdict(int)
+
+    async def do(self, route: str, scope, params: tuple, fn):
+        key = (route, scope, params)
+        task = self.calls.get(key)
+        if task is None:
+            self.leaders[route] += 1
+            metrics.inc("hrms_singleflight_requests_total", {"route": route, "result": "leader"})
+            # A task, so one caller disconnecting doesn't cancel the query for everyone else
+            task = self.calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._settled(key, done))
+        else:
+            self.coalesced[route] += 1
+            metrics.inc("hrms_singleflight_requests_total", {"route": route, "result": "coalesced"})
+        return await asyncio.shield(task)
+
+    def _settled(self, key: tuple, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller went away
+
+    def stats(self) -> dict:
+        routes = {}
+        for route in set(self.leaders) | set(self.coalesced):
+            total = self.leaders[route] + self.coalesced[route]
+            routes[route] = {
+                "leaders": self.leaders[route],
+                "coalesced": self.coalesced[route],
+                "coalescing_ratio": round(self.coalesced[route] / total, 4) if total else 0.0
+            }
+        return {"in_flight": len(self.calls), "routes": routes}
+
+single_flight = SingleFlight()
+
+# Strong validator over the data version plus everything else the body depends on (caller, query)
+def make_etag(request: Request, current_user: dict, *parts) -> str:
+    key = "|".join(str(part) for part in (*parts, current_user["id"], request.url.query))
+    return f'"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+def with_etag(response: Response, etag: str) -> Response:
+    # no-cache: browsers keep the body but must revalidate, which costs a 304 and no Mongo round-trip
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+def not_modified(etag: str) -> Response:
+    return with_etag(Response(status_code=304), etag)
+
+# ============== PASSWORD HASHING ==============
+
+# Accounts created before bcrypt hold an unsalted SHA-256 hex digest; they are upgraded at their next login
+LEGACY_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+def bcrypt_hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+def bcrypt_check(password: str, stored: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode(), stored.encode())
+    except ValueError:
+        return False
+
+class PasswordHasher:
+    # bcrypt releases the GIL, so a dedicated thread pool spreads hashing over the cores while the event
+    # loop keeps serving. The semaphore caps work in flight; past max_waiting callers get a 503 instead of
+    # an ever-growing queue.
+    def __init__(self, rounds: int, workers: int, max_waiting: int):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+        self.active = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.dummy_hash = None
+    
+    async def run(self, op: str, fn, *args):
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many sign-ins in progress, try again shortly",
+                                headers={"Retry-After": "1"})
+        self.waiting += 1
+        queued = time.perf_counter()
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        metrics.observe("hrms_password_hash_wait_seconds", {"op": op}, started - queued)
+        self.active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.active -= 1
+            self.slots.release()
+            metrics.observe("hrms_password_hash_seconds", {"op": op}, time.perf_counter() - started)
+    
+    async def hash(self, password: str) -> str:
+        return await self.run("hash", bcrypt_hash, password, self.rounds)
+    
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        # Bulk callers keep at most one call per thread outstanding, so sign-ins still find room in the queue
+        gate = asyncio.Semaphore(self.workers)
+        
+        async def hash_one(password: str) -> str:
+            async with gate:
+                return await self.hash(password)
+        
+        return list(await asyncio.gather(*(hash_one(password) for password in passwords)))
+    
+    async def verify(self, password: str, stored: Optional[str]) -> bool:
+        if stored and LEGACY_HASH_RE.match(stored):
+            return hmac.compare_digest(stored, hashlib.sha256(password.encode()).hexdigest())
+        if not stored:
+            # Unknown usernames still cost a bcrypt check, so response times don't reveal which ones exist
+            if self.dummy_hash is None:
+                self.dummy_hash = await self.hash(uuid.uuid4().hex)
+            await self.run("verify", bcrypt_check, password, self.dummy_hash)
+            return False
+        return await self.run("verify", bcrypt_check, password, stored)
+    
+    def needs_rehash(self, stored: str) -> bool:
+        if LEGACY_HASH_RE.match(stored):
+            return True
+        try:
+            return int(stored.split("$")[2]) < self.rounds
+        except (IndexError, ValueError):
+            return True
+
+password_hasher = PasswordHasher(PASSWORD_HASH_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_WAITING)
+
 # ============== HELPERS ==============
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+def validation_message(error: ValidationError) -> str:
+    # First problem only, as "field: message", for per-row upload reports
+    first = error.errors()[0]
+    location = ".".join(str(part) for part in first["loc"])
+    return f"{location}: {first['msg']}" if location else first["msg"]
 
 def create_token(user_id: str, role: str) -> str:
     payload = {
@@ -171,31 +848,714 @@ def create_token(user_id: str, role: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    if not credentials:
-        raise HTTPException(status_code=401, detail="Not authenticated")
+def create_stream_ticket(user_id: str) -> str:
+    payload = {
+        "user_id": user_id,
+        "purpose": "stream",
+        "exp": datetime.now(timezone.utc).timestamp() + STREAM_TICKET_TTL
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
+
+async def authenticate(token: str, purpose: Optional[str] = None) -> dict:
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=["HS256"])
-        user = await db.employees.find_one({"id": payload["user_id"]}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        # Stream tickets are not login tokens, and login tokens never belong in a URL
+        if payload.get("purpose") != purpose:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        # Entries are only good at the employees version they were read at, so an employee write on any
+        # worker (role change, delete, password change) revokes them once that worker's counter moves
+        version = await collection_versions.get("employees")
+        cached = principal_cache.get(payload["user_id"])
+        if cached is not None and cached[0] == version:
+            user = cached[1]
+        else:
+            user = await db.employees.find_one({"id": payload["user_id"]}, {"_id": 0})
+            if not user:
+                raise HTTPException(status_code=401, detail="User not found")
+            principal_cache.set(user["id"], (version, user))
+        return dict(user)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await authenticate(credentials.credentials)
+
+async def get_stream_user(
+    ticket: Optional[str] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    # EventSource cannot send headers, so streams also take a short-lived ticket as a query parameter
+    if credentials:
+        return await authenticate(credentials.credentials)
+    if not ticket:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await authenticate(ticket, purpose="stream")
+
+# ============== PAGINATION ==============
+
+def encode_cursor(last_id: ObjectId) -> str:
+    return base64.urlsafe_b64encode(last_id.binary).decode().rstrip("=")
+
+def decode_cursor(token: str) -> ObjectId:
+    try:
+        return ObjectId(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (InvalidId, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def page_params(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False
+) -> dict:
+    return {
+        "limit": limit,
+        "after": decode_cursor(after) if after else None,
+        "stream": stream
+    }
+
+async def ndjson_lines(cursor):
+    async for doc in cursor:
+        doc.pop("_id", None)
+        yield orjson.dumps(doc, default=str, option=orjson.OPT_APPEND_NEWLINE)
+
+# Upload bodies are read line by line as they arrive; yields (line number, raw line) for non-blank lines
+async def read_ndjson_lines(request: Request):
+    # Each chunk is scanned once; an unfinished line is kept as parts and joined when its newline arrives
+    parts, part_bytes, received, line_no = [], 0, 0, 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Uploads are limited to {UPLOAD_MAX_BYTES} bytes")
+        start = 0
+        while start < len(chunk):
+            end = chunk.find(b"\n", start)
+            piece = chunk[start:] if end == -1 else chunk[start:end]
+            part_bytes += len(piece)
+            if part_bytes > UPLOAD_MAX_LINE_BYTES:
+                raise HTTPException(status_code=413, detail=f"Line {line_no + 1} is longer than {UPLOAD_MAX_LINE_BYTES} bytes")
+            parts.append(piece)
+            if end == -1:
+                break
+            line, parts, part_bytes = b"".join(parts), [], 0
+            line_no += 1
+            start = end + 1
+            if line.strip():
+                yield line_no, line
+    line = b"".join(parts)
+    if line.strip():
+        yield line_no + 1, line
+
+async def read_csv_records(request: Request):
+    # One dict per CSV record keyed by the header row; quoted values may span lines
+    header, pending, start = None, "", None
+    async for line_no, line in read_ndjson_lines(request):
+        text = line.decode(errors="replace").rstrip("\r")
+        pending = f"{pending}\n{text}" if pending else text
+        start = start or line_no
+        if pending.count('"') % 2:
+            continue
+        values = next(csv.reader([pending]))
+        record_line, pending, start = start, "", None
+        if header is None:
+            header = [name.strip().lstrip("\ufeff") for name in values]
+            continue
+        yield record_line, dict(zip(header, values))
+
+EMPLOYEE_SUMMARY_FIELDS = ["name", "employee_id", "department", "designation"]
+
+# Joins the owning employee's summary fields onto each row as `employee`
+EMPLOYEE_LOOKUP = [
+    {"$lookup": {"from": "employees", "localField": "employee_id", "foreignField": "id", "as": "employee"}},
+    {"$set": {"employee": {"$let": {
+        "vars": {"emp": {"$arrayElemAt": ["$employee", 0]}},
+        "in": {field: f"$$emp.{field}" for field in EMPLOYEE_SUMMARY_FIELDS}
+    }}}},
+]
+
+def expand_params(expand: Optional[str] = None) -> Optional[list]:
+    if expand is None:
+        return None
+    if expand != "employee":
+        raise HTTPException(status_code=400, detail="Unsupported expand value")
+    return EMPLOYEE_LOOKUP
+
+def employee_summary_projection(*extra: str) -> dict:
+    return {"_id": 0, "id": 1, **{field: 1 for field in EMPLOYEE_SUMMARY_FIELDS + list(extra)}}
+
+# Sparse fieldsets: ?fields=name,status becomes an inclusion projection
+FIELD_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+HIDDEN_FIELDS = {"password"}
+MAX_FIELDS = 50
+
+def fields_param(fields: Optional[str] = None) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if not names or len(names) > MAX_FIELDS or not all(FIELD_NAME_RE.match(name) for name in names):
+        raise HTTPException(status_code=400, detail="Invalid fields parameter")
+    # id is always returned, secrets never are, and a parent path makes its children redundant
+    names = ["id"] + [name for name in names if name.split(".")[0] not in HIDDEN_FIELDS]
+    return [
+        name for name in dict.fromkeys(names)
+        if not any(name.startswith(f"{other}.") for other in names if other != name)
+    ]
+
+def field_projection(fields: Optional[List[str]], default: dict) -> dict:
+    if fields is None:
+        return default
+    return {"_id": 0, **{name: 1 for name in fields}}
+
+def pick_fields(doc: dict, fields: Optional[List[str]]) -> dict:
+    # For documents already in memory; nested paths select their whole top-level field
+    if fields is None:
+        return doc
+    top_level = {name.split(".")[0] for name in fields}
+    return {k: v for k, v in doc.items() if k in top_level}
+
+async def list_documents(collection, query: dict, projection: dict, page: dict, lookup: Optional[list] = None):
+    # Keyset pagination over _id; the next page token is returned in X-Next-Cursor
+    if page["after"]:
+        query = {**query, "_id": {"$gt": page["after"]}}
+    projection = {k: v for k, v in projection.items() if k != "_id"} or None
+    if lookup and projection and 1 in projection.values():
+        projection["employee"] = 1
+    limit = page["limit"] if page["stream"] else (page["limit"] or DEFAULT_PAGE_SIZE) + 1
+    
+    if lookup:
+        pipeline = [{"$match": query}, {"$sort": {"_id": 1}}]
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline.extend(lookup)
+        if projection:
+            pipeline.append({"$project": projection})
+        cursor = collection.aggregate(pipeline, batchSize=STREAM_BATCH_SIZE)
+    else:
+        cursor = collection.find(query, projection).sort("_id", 1).batch_size(STREAM_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+    
+    if page["stream"]:
+        return StreamingResponse(ndjson_lines(cursor), media_type="application/x-ndjson")
+    
+    docs = await cursor.to_list(limit)
+    headers = {}
+    if len(docs) == limit:
+        docs = docs[:-1]
+        headers["X-Next-Cursor"] = encode_cursor(docs[-1]["_id"])
+    for doc in docs:
+        del doc["_id"]
+    # Mongo documents are already JSON-native; skip jsonable_encoder and response-model validation
+    return ORJSONResponse(docs, headers=headers)
+
+# ============== INDEXES ==============
+
+INDEXES = {
+    "employees": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("role", ASCENDING)]),
+        IndexModel([("employee_id", ASCENDING)]),
+    ],
+    "attendance": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("employee_id", ASCENDING), ("date", ASCENDING)], unique=True),
+        IndexModel([("date", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "leaves": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("start_date", ASCENDING), ("end_date", ASCENDING)]),
+        IndexModel([("employee_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "leave_balances": [
+        IndexModel([("employee_id", ASCENDING), ("year", ASCENDING), ("type", ASCENDING)], unique=True),
+        IndexModel([("year", ASCENDING)]),
+    ],
+    "fines": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("employee_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "appeals": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("employee_id", ASCENDING), ("status", ASCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+    ],
+    "payroll": [
+        IndexModel([("employee_id", ASCENDING), ("month", ASCENDING), ("year", ASCENDING)], unique=True),
+        IndexModel([("month", ASCENDING), ("year", ASCENDING)]),
+    ],
+    "settings": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "lead_permissions": [
+        IndexModel([("lead_id", ASCENDING)], unique=True),
+    ],
+    "media": [
+        IndexModel([("hash", ASCENDING)], unique=True),
+    ],
+    "attendance_monthly": [
+        IndexModel([("employee_id", ASCENDING), ("month", ASCENDING)], unique=True),
+        IndexModel([("month", ASCENDING)]),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("active_key", ASCENDING)], unique=True, partialFilterExpression={"active_key": {"$exists": True}}),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+    ],
+}
+
+# (route, collection, filter, sort) for every query a route issues against Mongo
+QUERY_SHAPES = [
+    ("get_current_user", "employees", {"id": "x"}, None),
+    ("login", "employees", {"username": "x"}, None),
+    ("get_employees", "employees", {}, {"_id": 1}),
+    ("get_leads", "employees", {"role": "LEAD"}, None),
+    ("get_attendance", "attendance", {"employee_id": "x", "date": "x"}, {"_id": 1}),
+    ("get_attendance", "attendance", {"date": "x"}, {"_id": 1}),
+    ("update_attendance", "attendance", {"id": "x"}, None),
+    ("check_in", "attendance", {"employee_id": "x", "date": "x"}, None),
+    ("bulk_attendance", "employees", {"employee_id": {"$in": ["x"]}}, None),
+    ("bulk_attendance", "employees", {"id": {"$in": ["x"]}}, None),
+    ("get_leaves", "leaves", {"employee_id": "x", "status": "x"}, {"_id": 1}),
+    ("get_leaves", "leaves", {"status": "x"}, {"_id": 1}),
+    ("update_leave", "leaves", {"id": "x"}, None),
+    ("leave_balances", "leave_balances", {"employee_id": "x", "year": "x", "type": "x"}, None),
+    ("get_leave_balances", "leave_balances", {"employee_id": "x", "year": "x"}, None),
+    ("get_leave_balances", "leave_balances", {"year": "x"}, None),
+    ("get_fines", "fines", {"employee_id": "x"}, {"_id": 1}),
+    ("update_fine", "fines", {"id": "x"}, None),
+    ("get_appeals", "appeals", {"employee_id": "x", "status": "x"}, {"_id": 1}),
+    ("get_appeals", "appeals", {"status": "x"}, {"_id": 1}),
+    ("get_payroll", "payroll", {"month": "x", "year": "x"}, {"_id": 1}),
+    ("get_payroll", "payroll", {"employee_id": "x"}, {"_id": 1}),
+    ("process_payroll", "payroll", {"employee_id": "x", "month": "x", "year": "x"}, None),
+    ("process_payroll", "fines", {"employee_id": {"$in": ["x"]}, "status": "Unpaid"}, None),
+    ("process_payroll", "attendance", {"employee_id": {"$in": ["x"]}, "date": {"$gte": "x", "$lte": "x"}}, None),
+    ("process_payroll", "leaves", {"employee_id": {"$in": ["x"]}, "status": "Approved", "start_date": {"$lte": "x"}, "end_date": {"$gte": "x"}}, None),
+    ("get_job", "jobs", {"id": "x"}, None),
+    ("claim_job", "jobs", {"status": "queued", "type": {"$in": ["x"]}}, {"created_at": 1}),
+    ("reap_jobs", "jobs", {"status": "running", "lease_expires_at": {"$lt": "x"}}, None),
+    ("get_settings", "settings", {"id": "settings"}, None),
+    ("get_lead_permissions", "lead_permissions", {"lead_id": "x"}, None),
+    ("get_media", "media", {"hash": "x"}, None),
+    ("get_attendance_monthly", "attendance_monthly", {"month": "x"}, None),
+    ("get_attendance_monthly", "attendance_monthly", {"employee_id": "x", "month": "x"}, None),
+    ("get_dashboard_stats", "attendance", {"date": "x", "status": {"$in": ["Present", "Late"]}}, None),
+    ("get_dashboard_stats", "leaves", {"status": "Approved", "start_date": {"$lte": "x"}, "end_date": {"$gte": "x"}}, None),
+]
+
+async def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            # Usually pre-existing duplicates blocking a unique index; keep serving and report it
+            logger.error(f"Could not create indexes on {collection}: {e}")
+
+def plan_stages(plan) -> set:
+    stages = set()
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.add(plan["stage"])
+        for value in plan.values():
+            stages |= plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages |= plan_stages(value)
+    return stages
+
+async def index_coverage_report() -> list:
+    report = []
+    for route, collection, query, sort in QUERY_SHAPES:
+        find = {"find": collection, "filter": query}
+        if sort:
+            find["sort"] = sort
+        explain = await db.command({"explain": find, "verbosity": "queryPlanner"})
+        stages = plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        report.append({
+            "route": route,
+            "collection": collection,
+            "filter": query,
+            "sort": sort,
+            "stages": sorted(stages),
+            "covered": "COLLSCAN" not in stages
+        })
+    return report
+
+# ============== MEDIA STORE ==============
+
+DATA_URL_RE = re.compile(r"^data:(image/[\w.+-]+);base64,(.*)$", re.DOTALL)
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Raster formats accepted for upload, by the format Pillow detects; the client's content type is
+# never trusted (an image/svg+xml upload served from the API origin would be stored XSS)
+IMAGE_CONTENT_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "GIF": "image/gif", "WEBP": "image/webp"}
+
+class DiskMediaStore:
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _write(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        return path.read_bytes() if path.exists() else None
+
+    async def put(self, key: str, data: bytes):
+        await asyncio.to_thread(self._write, key, data)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, key)
+
+class GridFSMediaStore:
+    def __init__(self, database):
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name="media")
+
+    async def put(self, key: str, data: bytes):
+        await self.bucket.upload_from_stream(key, data)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            stream = await self.bucket.open_download_stream_by_name(key)
+        except NoFile:
+            return None
+        return await stream.read()
+
+def get_media_store():
+    if MEDIA_STORAGE == "gridfs":
+        return GridFSMediaStore(db)
+    return DiskMediaStore(MEDIA_ROOT)
+
+def make_thumbnail(data: bytes) -> tuple:
+    with Image.open(io.BytesIO(data)) as img:
+        # draft() lets JPEGs decode at a reduced scale; converting after the resize keeps the full-size bitmap in its source mode
+        img.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=85, optimize=True)
+    return out.getvalue(), "image/jpeg"
+
+def validate_image(data: bytes) -> str:
+    # Returns the content type for the format Pillow actually decoded
+    if len(data) > MEDIA_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Image is too large")
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            image_format = img.format
+            width, height = img.size
+            if width * height <= MEDIA_MAX_PIXELS:
+                img.verify()
+    except Exception:
+        raise HTTPException(status_code=400, detail="Only JPEG, PNG, GIF and WebP images are supported")
+    if width * height > MEDIA_MAX_PIXELS:
+        raise HTTPException(status_code=413, detail="Image dimensions are too large")
+    if image_format not in IMAGE_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Only JPEG, PNG, GIF and WebP images are supported")
+    return IMAGE_CONTENT_TYPES[image_format]
+
+async def store_image(data: bytes) -> dict:
+    content_type = validate_image(data)
+    digest = hashlib.sha256(data).hexdigest()
+    
+    # Content-addressed: identical uploads are stored once
+    media = await db.media.find_one({"hash": digest}, {"_id": 0})
+    if not media:
+        thumb, thumb_type = await asyncio.to_thread(make_thumbnail, data)
+        store = get_media_store()
+        await store.put(digest, data)
+        await store.put(f"{digest}-thumb", thumb)
+        media = {
+            "hash": digest,
+            "content_type": content_type,
+            "thumb_content_type": thumb_type,
+            "size": len(data),
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        await db.media.update_one({"hash": digest}, {"$setOnInsert": media}, upsert=True)
+    
+    return {
+        "hash": digest,
+        "url": f"/api/media/{digest}",
+        "thumbnail_url": f"/api/media/{digest}/thumb"
+    }
+
+async def resolve_profile_pic(value: Optional[str]) -> Optional[str]:
+    # Older clients still send inline data: URLs; keep only a reference on the employee
+    match = DATA_URL_RE.match(value or "")
+    if not match:
+        return value
+    try:
+        data = base64.b64decode(match.group(2), validate=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image data")
+    stored = await store_image(data)
+    return stored["thumbnail_url"]
+
+# ============== JOBS ==============
+
+JOB_HANDLERS = {}
+
+def job_handler(job_type: str):
+    def register(handler):
+        JOB_HANDLERS[job_type] = handler
+        return handler
+    return register
+
+class JobCancelled(Exception):
+    pass
+
+class JobContext:
+    def __init__(self, job: dict, runner: "JobRunner"):
+        self.id = job["id"]
+        self.params = job.get("params") or {}
+        self.runner = runner
+        self.timings = {}
+        self.cancel_requested = False
+    
+    async def progress(self, **fields):
+        await self.checkpoint({f"progress.{key}": value for key, value in fields.items()})
+    
+    async def record_phase(self, name: str, elapsed_ms: float, final: bool = False):
+        self.timings[name] = elapsed_ms
+        await self.checkpoint({f"timings.{name}": elapsed_ms, "progress.phase": name}, cancellable=not final)
+    
+    async def checkpoint(self, changes: dict, cancellable: bool = True):
+        # Every progress write doubles as a cancellation check
+        job = await db.jobs.find_one_and_update(
+            {"id": self.id, "lease_owner": self.runner.worker_id, "status": "running"},
+            {"$set": changes},
+            projection={"_id": 0, "status": 1, "cancel_requested": 1}
+        )
+        if job is None or job.get("cancel_requested"):
+            self.cancel_requested = True
+        if self.cancel_requested and cancellable:
+            raise JobCancelled()
+
+class JobRunner:
+    def __init__(self, concurrency: int, lease_seconds: float, poll_seconds: float):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.tasks = set()
+        self.wakeup = asyncio.Event()
+    
+    async def submit(self, job_type: str, params: dict, created_by: str, dedupe_key: Optional[str] = None) -> dict:
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "params": params,
+            "status": "queued",
+            "progress": {},
+            "timings": {},
+            "created_by": created_by,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        if dedupe_key:
+            job["active_key"] = dedupe_key
+        try:
+            await db.jobs.insert_one(job)
+        except DuplicateKeyError:
+            # The same work is already queued or running: hand back that job instead of repeating it
+            existing = await db.jobs.find_one({"active_key": dedupe_key}, {"_id": 0})
+            if existing:
+                return existing
+            raise HTTPException(status_code=409, detail="Job finished while being submitted, retry")
+        job.pop("_id", None)
+        self.wakeup.set()
+        return job
+    
+    def lease_deadline(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+    
+    async def claim(self) -> Optional[dict]:
+        return await db.jobs.find_one_and_update(
+            {"status": "queued", "type": {"$in": list(JOB_HANDLERS)}},
+            {"$set": {
+                "status": "running",
+                "lease_owner": self.worker_id,
+                "lease_expires_at": self.lease_deadline(),
+                "started_at": datetime.now(timezone.utc).isoformat()
+            }},
+            sort=[("created_at", ASCENDING)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def reap(self):
+        # A lapsed lease means the worker died mid-run; fail the job rather than run it a second time
+        await db.jobs.update_many(
+            {"status": "running", "lease_expires_at": {"$lt": datetime.now(timezone.utc)}},
+            {"$set": {"status": "failed", "error": "Worker stopped before the job finished",
+                      "finished_at": datetime.now(timezone.utc).isoformat()},
+             "$unset": {"active_key": ""}}
+        )
+    
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                await self.reap()
+                while len(self.tasks) < self.concurrency:
+                    job = await self.claim()
+                    if job is None:
+                        break
+                    task = asyncio.create_task(self.execute(job))
+                    self.tasks.add(task)
+                    task.add_done_callback(self.finished)
+            except PyMongoError:
+                logger.exception("Job runner could not reach MongoDB")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+    
+    def finished(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        self.wakeup.set()
+    
+    async def heartbeat(self, ctx: JobContext):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            renewed = await db.jobs.find_one_and_update(
+                {"id": ctx.id, "lease_owner": self.worker_id, "status": "running"},
+                {"$set": {"lease_expires_at": self.lease_deadline()}},
+                projection={"_id": 0, "status": 1, "cancel_requested": 1}
+            )
+            if renewed is None or renewed.get("cancel_requested"):
+                ctx.cancel_requested = True
+    
+    async def execute(self, job: dict):
+        ctx = JobContext(job, self)
+        heartbeat = asyncio.create_task(self.heartbeat(ctx))
+        try:
+            result = await JOB_HANDLERS[job["type"]](ctx)
+            outcome = {"status": "succeeded", "result": result}
+        except JobCancelled:
+            outcome = {"status": "cancelled"}
+        except Exception as exc:
+            logger.exception(f"Job {job['id']} ({job['type']}) failed")
+            outcome = {"status": "failed", "error": str(exc) or exc.__class__.__name__}
+        finally:
+            heartbeat.cancel()
+        
+        outcome["finished_at"] = datetime.now(timezone.utc).isoformat()
+        await db.jobs.update_one(
+            {"id": job["id"], "lease_owner": self.worker_id, "status": "running"},
+            {"$set": outcome, "$unset": {"active_key": "", "lease_expires_at": ""}}
+        )
+
+job_runner = JobRunner(JOB_CONCURRENCY, JOB_LEASE_SECONDS, JOB_POLL_SECONDS)
+
+# ============== LIVE ATTENDANCE FEED ==============
+
+def attendance_event(kind: str, att: dict) -> dict:
+    record = {k: v for k, v in att.items() if k != "_id"}
+    return {"type": kind, "employee_id": record.get("employee_id"), "date": record.get("date"), "attendance": record}
+
+def change_kind(change: dict) -> str:
+    if change["operationType"] == "insert":
+        return "check_in"
+    updated = (change.get("updateDescription") or {}).get("updatedFields") or {}
+    return "check_out" if "check_out" in updated else "update"
+
+class AttendanceFeed:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.watching = False
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event: dict):
+        self.published += 1
+        # Serialized once per event, not once per subscriber
+        frame = f"event: {event['type']}\ndata: ".encode() + orjson.dumps(event, default=str) + b"\n\n"
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((event["employee_id"], frame))
+            except asyncio.QueueFull:
+                # A stalled client is cut loose; EventSource reconnects and reloads the board
+                self.dropped += 1
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+    def publish_local(self, kind: str, att: dict):
+        # While the change stream runs, writes from every worker arrive through it instead
+        if not self.watching:
+            self.publish(attendance_event(kind, att))
+
+    async def watch(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        while True:
+            try:
+                async with db.attendance.watch(pipeline, full_document="updateLookup") as stream:
+                    self.watching = True
+                    async for change in stream:
+                        if change.get("fullDocument"):
+                            self.publish(attendance_event(change_kind(change), change["fullDocument"]))
+                self.watching = False
+            except OperationFailure as e:
+                # Change streams need a replica set; each worker then fans out its own writes
+                logger.info(f"Attendance change stream unavailable, publishing in-process: {e}")
+                self.watching = False
+                return
+            except PyMongoError as e:
+                logger.warning(f"Attendance change stream interrupted: {e}")
+                self.watching = False
+                await asyncio.sleep(1)
+            except Exception:
+                # While watching, writes are not published in-process; a dead watcher would silence the feed
+                logger.exception("Attendance change stream failed")
+                self.watching = False
+                await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "watching": self.watching,
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": self.dropped
+        }
+
+attendance_feed = AttendanceFeed(ATTENDANCE_STREAM_QUEUE_SIZE)
+
 # ============== INIT DEFAULT DATA ==============
 
 async def init_default_data():
     # Check if admin exists
     admin = await db.employees.find_one({"username": "admin"})
     if not admin:
+        admin_password, sample_password = await asyncio.gather(
+            password_hasher.hash("123"), password_hasher.hash("12345678")
+        )
         default_admin = {
             "id": str(uuid.uuid4()),
             "name": "A.R HR Admin",
             "username": "admin",
-            "password": hash_password("123"),
+            "password": admin_password,
             "email": "admin@arhr.com",
             "phone": "",
             "department": "Administration",
@@ -218,7 +1578,7 @@ async def init_default_data():
                 "id": str(uuid.uuid4()),
                 "name": "Babar Azam",
                 "username": "babar",
-                "password": hash_password("12345678"),
+                "password": sample_password,
                 "email": "babar@arhr.com",
                 "phone": "0300-1234567",
                 "department": "Design",
@@ -237,7 +1597,7 @@ async def init_default_data():
                 "id": str(uuid.uuid4()),
                 "name": "Sara Ahmed",
                 "username": "sara",
-                "password": hash_password("12345678"),
+                "password": sample_password,
                 "email": "sara@arhr.com",
                 "phone": "0301-2345678",
                 "department": "Design",
@@ -255,6 +1615,7 @@ async def init_default_data():
         ]
         for emp in sample_employees:
             await db.employees.insert_one(emp)
+        await collection_versions.bump("employees")
         
         # Initialize settings
         default_settings = {
@@ -278,19 +1639,25 @@ async def init_default_data():
 @api_router.post("/auth/login")
 async def login(request: LoginRequest):
     user = await db.employees.find_one({"username": request.username}, {"_id": 0})
-    if not user:
+    stored = user["password"] if user else None
+    if not await password_hasher.verify(request.password, stored) or not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if user["password"] != hash_password(request.password):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+    # Legacy SHA-256 (or lower-cost) hashes are upgraded while the plaintext is at hand;
+    # matching on the old hash leaves a concurrent password change alone
+    if password_hasher.needs_rehash(stored):
+        upgraded = await password_hasher.hash(request.password)
+        await db.employees.update_one({"id": user["id"], "password": stored}, {"$set": {"password": upgraded}})
+        principal_cache.invalidate(user["id"])
+        password_hasher.rehashed += 1
     
     token = create_token(user["id"], user["role"])
     user_response = {k: v for k, v in user.items() if k != "password"}
     return {"token": token, "user": user_response}
 
 @api_router.get("/auth/me")
-async def get_me(current_user: dict = Depends(get_current_user)):
-    return {k: v for k, v in current_user.items() if k != "password"}
+async def get_me(fields: Optional[list] = Depends(fields_param), current_user: dict = Depends(get_current_user)):
+    return pick_fields({k: v for k, v in current_user.items() if k != "password"}, fields)
 
 @api_router.post("/auth/change-password")
 async def change_password(data: dict, current_user: dict = Depends(get_current_user)):
@@ -300,20 +1667,34 @@ async def change_password(data: dict, current_user: dict = Depends(get_current_u
     
     await db.employees.update_one(
         {"id": current_user["id"]},
-        {"$set": {"password": hash_password(new_password)}}
+        {"$set": {"password": await password_hasher.hash(new_password)}}
     )
+    principal_cache.invalidate(current_user["id"])
+    await collection_versions.bump("employees")
     return {"message": "Password changed successfully"}
 
 # ============== EMPLOYEE ROUTES ==============
 
 @api_router.get("/employees", response_model=List[Employee])
-async def get_employees(current_user: dict = Depends(get_current_user)):
-    employees = await db.employees.find({}, {"_id": 0, "password": 0}).to_list(1000)
-    return employees
+async def get_employees(
+    request: Request,
+    page: dict = Depends(page_params),
+    fields: Optional[list] = Depends(fields_param),
+    current_user: dict = Depends(get_current_user)
+):
+    etag = make_etag(request, current_user, "employees", await collection_versions.get("employees"))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    projection = field_projection(fields, {"password": 0})
+    return with_etag(await list_documents(db.employees, {}, projection, page), etag)
 
 @api_router.get("/employees/{employee_id}")
-async def get_employee(employee_id: str, current_user: dict = Depends(get_current_user)):
-    employee = await db.employees.find_one({"id": employee_id}, {"_id": 0, "password": 0})
+async def get_employee(
+    employee_id: str,
+    fields: Optional[list] = Depends(fields_param),
+    current_user: dict = Depends(get_current_user)
+):
+    employee = await db.employees.find_one({"id": employee_id}, field_projection(fields, {"_id": 0, "password": 0}))
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
     return employee
@@ -323,20 +1704,176 @@ async def create_employee(employee: EmployeeCreate, current_user: dict = Depends
     if current_user["role"] != "ADMIN":
         raise HTTPException(status_code=403, detail="Only admin can create employees")
     
-    existing = await db.employees.find_one({"username": employee.username})
-    if existing:
-        raise HTTPException(status_code=400, detail="Username already exists")
-    
+    # The unique username index is the duplicate check; a pre-read would only race with it
     emp_dict = employee.model_dump()
     emp_dict["id"] = str(uuid.uuid4())
-    emp_dict["password"] = hash_password(emp_dict["password"])
+    emp_dict["profile_pic"] = await resolve_profile_pic(emp_dict.get("profile_pic"))
+    emp_dict["password"] = await password_hasher.hash(emp_dict["password"])
     emp_dict["created_at"] = datetime.now(timezone.utc).isoformat()
     emp_dict["joining_date"] = emp_dict.get("joining_date") or datetime.now(timezone.utc).strftime("%Y-%m-%d")
     
-    await db.employees.insert_one(emp_dict)
+    try:
+        await db.employees.insert_one(emp_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username already exists")
+    await collection_versions.bump("employees")
     del emp_dict["password"]
     return emp_dict
 
+# Spreadsheet columns arrive as strings: blanks fall back to the model defaults and
+# allowed_modules is a ";"-separated list
+def import_record(record: dict) -> dict:
+    record = {key: value for key, value in record.items() if key and value not in ("", None)}
+    if isinstance(record.get("allowed_modules"), str):
+        record["allowed_modules"] = [m.strip() for m in record["allowed_modules"].split(";") if m.strip()]
+    return record
+
+async def read_import_records(request: Request):
+    # Yields (line number, record or None, error or None)
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        async for line_no, record in read_csv_records(request):
+            yield line_no, record, None
+        return
+    async for line_no, line in read_ndjson_lines(request):
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            yield line_no, None, "Invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "Each line must be a JSON object"
+            continue
+        yield line_no, record, None
+
+async def import_employee_chunk(chunk: List[tuple], upsert: bool, dry_run: bool) -> List[dict]:
+    # One $in lookup settles which usernames exist; new rows are inserted, existing ones updated or rejected
+    usernames = [employee.username for _, employee in chunk]
+    existing = {
+        emp["username"]: emp["id"]
+        for emp in await db.employees.find({"username": {"$in": usernames}}, {"_id": 0, "id": 1, "username": 1}).to_list(None)
+    }
+    results, rows, creates = [], [], []
+    for line_no, employee in chunk:
+        if employee.username in existing and not upsert:
+            results.append({"line": line_no, "username": employee.username, "status": "rejected", "error": "Username already exists"})
+            continue
+        rows.append((line_no, employee))
+        if employee.username not in existing:
+            creates.append(employee)
+    if dry_run:
+        return results + [
+            {"line": line_no, "username": employee.username, "status": "valid",
+             "action": "update" if employee.username in existing else "create"}
+            for line_no, employee in rows
+        ]
+    
+    hashes = iter(await password_hasher.hash_many([employee.password for employee in creates]))
+    now = datetime.now(timezone.utc)
+    operations, written = [], []
+    for line_no, employee in rows:
+        existing_id = existing.get(employee.username)
+        # Updates only touch the columns the row supplied, and never an existing account's password
+        fields = employee.model_dump(exclude={"password"}, exclude_unset=existing_id is not None)
+        password_hash = None if existing_id else next(hashes)
+        if fields.get("profile_pic"):
+            try:
+                fields["profile_pic"] = await resolve_profile_pic(fields["profile_pic"])
+            except HTTPException as e:
+                results.append({"line": line_no, "username": employee.username, "status": "rejected", "error": e.detail})
+                continue
+        if existing_id:
+            operations.append(UpdateOne({"username": employee.username}, {"$set": fields}))
+            written.append((line_no, employee.username, existing_id, "updated"))
+        else:
+            fields.update({
+                "id": str(uuid.uuid4()),
+                "password": password_hash,
+                "created_at": now.isoformat(),
+                "joining_date": fields.get("joining_date") or now.strftime("%Y-%m-%d")
+            })
+            operations.append(InsertOne(fields))
+            written.append((line_no, employee.username, fields["id"], "created"))
+    
+    failed = {}
+    if operations:
+        try:
+            await db.employees.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                duplicate = error.get("code") == 11000
+                failed[error["index"]] = "Username already exists" if duplicate else error.get("errmsg", "Write failed")
+    for index, (line_no, username, employee_id, status) in enumerate(written):
+        if index in failed:
+            results.append({"line": line_no, "username": username, "status": "failed", "error": failed[index]})
+        else:
+            results.append({"line": line_no, "username": username, "status": status, "id": employee_id})
+            if status == "updated":
+                principal_cache.invalidate(employee_id)
+    return results
+
+@api_router.post("/employees/import")
+async def import_employees(
+    request: Request,
+    mode: str = Query("create", pattern="^(create|upsert)$"),
+    dry_run: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Only admin can import employees")
+    
+    # The whole file is read and validated before the first write, so the row cap never leaves a partial import
+    results, valid, seen, rows = [], [], set(), 0
+    async for line_no, record, error in read_import_records(request):
+        rows += 1
+        if rows > EMPLOYEE_IMPORT_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"At most {EMPLOYEE_IMPORT_MAX_ROWS} rows per import")
+        if error is None:
+            try:
+                employee = EmployeeCreate.model_validate(import_record(record))
+            except ValidationError as e:
+                error = validation_message(e)
+        if error is None and employee.username in seen:
+            error = "Duplicate username in this file"
+        if error:
+            results.append({"line": line_no, "username": (record or {}).get("username"), "status": "rejected", "error": error})
+            continue
+        seen.add(employee.username)
+        valid.append((line_no, employee))
+    
+    written = False
+    try:
+        for offset in range(0, len(valid), EMPLOYEE_IMPORT_CHUNK_SIZE):
+            try:
+                chunk_results = await import_employee_chunk(
+                    valid[offset:offset + EMPLOYEE_IMPORT_CHUNK_SIZE], mode == "upsert", dry_run
+                )
+            except (HTTPException, PyMongoError) as e:
+                # Earlier chunks stay imported; the report marks every row from here on as not imported
+                logger.warning(f"Employee import stopped at line {valid[offset][0]}: {e}")
+                error = e.detail if isinstance(e, HTTPException) else "Write failed"
+                results.extend(
+                    {"line": line_no, "username": employee.username, "status": "failed", "error": f"Not imported: {error}"}
+                    for line_no, employee in valid[offset:]
+                )
+                break
+            results.extend(chunk_results)
+            written = written or any(row["status"] in ("created", "updated") for row in chunk_results)
+    finally:
+        if written:
+            await collection_versions.bump("employees")
+    results.sort(key=lambda row: row["line"])
+    
+    counts = defaultdict(int)
+    for row in results:
+        counts[row["status"]] += 1
+    return {
+        "dry_run": dry_run,
+        "received": rows,
+        **{status: counts[status] for status in (("valid",) if dry_run else ("created", "updated", "failed"))},
+        "rejected": counts["rejected"],
+        "results": results
+    }
+
 @api_router.put("/employees/{employee_id}")
 async def update_employee(employee_id: str, update: EmployeeUpdate, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "ADMIN" and current_user["id"] != employee_id:
@@ -344,10 +1881,17 @@ async def update_employee(employee_id: str, update: EmployeeUpdate, current_user
     
     update_dict = {k: v for k, v in update.model_dump().items() if v is not None}
     if "password" in update_dict:
-        update_dict["password"] = hash_password(update_dict["password"])
+        update_dict["password"] = await password_hasher.hash(update_dict["password"])
+    if "profile_pic" in update_dict:
+        update_dict["profile_pic"] = await resolve_profile_pic(update_dict["profile_pic"])
     
     if update_dict:
-        await db.employees.update_one({"id": employee_id}, {"$set": update_dict})
+        try:
+            await db.employees.update_one({"id": employee_id}, {"$set": update_dict})
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Username already exists")
+        principal_cache.invalidate(employee_id)
+        await collection_versions.bump("employees")
     
     employee = await db.employees.find_one({"id": employee_id}, {"_id": 0, "password": 0})
     return employee
@@ -358,16 +1902,72 @@ async def delete_employee(employee_id: str, current_user: dict = Depends(get_cur
         raise HTTPException(status_code=403, detail="Only admin can delete employees")
     
     result = await db.employees.delete_one({"id": employee_id})
+    principal_cache.invalidate(employee_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Employee not found")
+    await collection_versions.bump("employees")
     return {"message": "Employee deleted"}
 
+# ============== MEDIA ROUTES ==============
+
+@api_router.post("/media")
+async def upload_media(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+    data = await file.read(MEDIA_MAX_BYTES + 1)
+    return await store_image(data)
+
+@api_router.post("/employees/{employee_id}/photo")
+async def upload_employee_photo(employee_id: str, file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "ADMIN" and current_user["id"] != employee_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    data = await file.read(MEDIA_MAX_BYTES + 1)
+    stored = await store_image(data)
+    result = await db.employees.update_one({"id": employee_id}, {"$set": {"profile_pic": stored["thumbnail_url"]}})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Employee not found")
+    principal_cache.invalidate(employee_id)
+    await collection_versions.bump("employees")
+    return {**stored, "profile_pic": stored["thumbnail_url"]}
+
+@api_router.get("/media/{media_hash}")
+async def get_media(media_hash: str, request: Request):
+    return await serve_media(media_hash, request, thumbnail=False)
+
+@api_router.get("/media/{media_hash}/thumb")
+async def get_media_thumbnail(media_hash: str, request: Request):
+    return await serve_media(media_hash, request, thumbnail=True)
+
+async def serve_media(media_hash: str, request: Request, thumbnail: bool):
+    key = f"{media_hash}-thumb" if thumbnail else media_hash
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": MEDIA_CACHE_CONTROL, "X-Content-Type-Options": "nosniff"}
+    # Content never changes for a given hash, so a matching ETag needs no lookup
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    media = await db.media.find_one({"hash": media_hash}, {"_id": 0})
+    if not media:
+        raise HTTPException(status_code=404, detail="Media not found")
+    data = await get_media_store().get(key)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Media not found")
+    
+    content_type = media["thumb_content_type"] if thumbnail else media["content_type"]
+    # Records stored before uploads were sniffed may carry a client-supplied type; never serve those inline
+    if content_type not in IMAGE_CONTENT_TYPES.values():
+        content_type = "application/octet-stream"
+        headers["Content-Disposition"] = "attachment"
+    return Response(content=data, media_type=content_type, headers=headers)
+
 # ============== ATTENDANCE ROUTES ==============
 
 @api_router.get("/attendance")
 async def get_attendance(
     employee_id: Optional[str] = None,
     date: Optional[str] = None,
+    page: dict = Depends(page_params),
+    fields: Optional[list] = Depends(fields_param),
+    lookup: Optional[list] = Depends(expand_params),
     current_user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -379,33 +1979,87 @@ async def get_attendance(
     if current_user["role"] == "EMPLOYEE":
         query["employee_id"] = current_user["id"]
     
-    attendance = await db.attendance.find(query, {"_id": 0}).to_list(1000)
-    return attendance
+    return await list_documents(db.attendance, query, field_projection(fields, {}), page, lookup)
+
+@api_router.get("/attendance/board")
+async def get_attendance_board(date: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] == "EMPLOYEE":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    date = date or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    employees, attendance = await asyncio.gather(
+        db.employees.find({"role": "EMPLOYEE"}, employee_summary_projection()).to_list(None),
+        db.attendance.find({"date": date}, {"_id": 0}).to_list(None)
+    )
+    records = {att["employee_id"]: att for att in attendance}
+    return ORJSONResponse([{**emp, "attendance": records.get(emp["id"])} for emp in employees])
+
+@api_router.post("/attendance/stream/ticket")
+async def attendance_stream_ticket(current_user: dict = Depends(get_current_user)):
+    return {"ticket": create_stream_ticket(current_user["id"]), "expires_in": STREAM_TICKET_TTL}
+
+@api_router.get("/attendance/stream")
+async def attendance_stream(current_user: dict = Depends(get_stream_user)):
+    # Admins and leads see everyone's check-ins; employees only their own
+    own_id = None if current_user["role"] in ("ADMIN", "LEAD") else current_user["id"]
+    
+    async def events():
+        queue = attendance_feed.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), ATTENDANCE_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    return
+                employee_id, frame = item
+                if own_id and employee_id != own_id:
+                    continue
+                yield frame
+        finally:
+            attendance_feed.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @api_router.post("/attendance")
 async def create_attendance(attendance: AttendanceCreate, current_user: dict = Depends(get_current_user)):
     att_dict = attendance.model_dump()
     att_dict["id"] = str(uuid.uuid4())
     
-    # Check if already checked in today
-    existing = await db.attendance.find_one({
-        "employee_id": att_dict["employee_id"],
-        "date": att_dict["date"]
-    })
-    if existing:
+    # One record per employee per day is enforced by the unique (employee_id, date) index
+    try:
+        await db.attendance.insert_one(att_dict)
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Already checked in today")
-    
-    await db.attendance.insert_one(att_dict)
+    await apply_attendance_rollup(None, att_dict)
+    attendance_feed.publish_local("check_in", att_dict)
     return {k: v for k, v in att_dict.items() if k != "_id"}
 
 @api_router.put("/attendance/{attendance_id}")
 async def update_attendance(attendance_id: str, update: dict, current_user: dict = Depends(get_current_user)):
-    update_data = {k: v for k, v in update.items() if v is not None and k != "id"}
+    update_data = {k: v for k, v in update.items() if v is not None and k not in ("_id", "id")}
     
-    if update_data:
-        await db.attendance.update_one({"id": attendance_id}, {"$set": update_data})
+    if not update_data:
+        return await db.attendance.find_one({"id": attendance_id}, {"_id": 0})
     
-    attendance = await db.attendance.find_one({"id": attendance_id}, {"_id": 0})
+    before = await db.attendance.find_one_and_update(
+        {"id": attendance_id},
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        return None
+    attendance = {**before, **update_data}
+    await apply_attendance_rollup(before, attendance)
+    attendance_feed.publish_local("update", attendance)
     return attendance
 
 @api_router.post("/attendance/check-in")
@@ -413,15 +2067,8 @@ async def check_in(data: dict, current_user: dict = Depends(get_current_user)):
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     now = datetime.now(timezone.utc).strftime("%H:%M")
     
-    existing = await db.attendance.find_one({
-        "employee_id": current_user["id"],
-        "date": today
-    })
-    if existing:
-        raise HTTPException(status_code=400, detail="Already checked in today")
-    
-    settings = await db.settings.find_one({"id": "settings"})
-    office_start = settings.get("office_start_time", "09:00") if settings else "09:00"
+    settings = await settings_cache.get()
+    office_start = settings.get("office_start_time", "09:00")
     is_late = now > office_start
     
     att_dict = {
@@ -438,44 +2085,372 @@ async def check_in(data: dict, current_user: dict = Depends(get_current_user)):
         "working_hours": None
     }
     
-    await db.attendance.insert_one(att_dict)
-    return {k: v for k, v in att_dict.items() if k != "_id"}
+    # One round-trip; the unique (employee_id, date) index settles concurrent taps
+    try:
+        result = await db.attendance.update_one(
+            {"employee_id": current_user["id"], "date": today},
+            {"$setOnInsert": att_dict},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Already checked in today")
+    if result.upserted_id is None:
+        raise HTTPException(status_code=400, detail="Already checked in today")
+    await apply_attendance_rollup(None, att_dict)
+    attendance_feed.publish_local("check_in", att_dict)
+    return att_dict
 
 @api_router.post("/attendance/check-out")
 async def check_out(data: dict, current_user: dict = Depends(get_current_user)):
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     now = datetime.now(timezone.utc).strftime("%H:%M")
     
-    attendance = await db.attendance.find_one({
-        "employee_id": current_user["id"],
-        "date": today
-    })
-    if not attendance:
-        raise HTTPException(status_code=400, detail="No check-in record found")
-    if attendance.get("check_out"):
-        raise HTTPException(status_code=400, detail="Already checked out")
-    
-    # Calculate working hours
-    check_in_time = attendance["check_in"]
-    check_in_parts = check_in_time.split(":")
-    check_out_parts = now.split(":")
-    hours_worked = (int(check_out_parts[0]) - int(check_in_parts[0])) + (int(check_out_parts[1]) - int(check_in_parts[1])) / 60
-    
-    settings = await db.settings.find_one({"id": "settings"})
-    office_end = settings.get("office_end_time", "18:00") if settings else "18:00"
+    settings = await settings_cache.get()
+    office_end = settings.get("office_end_time", "18:00")
     is_early = now < office_end
     
-    await db.attendance.update_one(
-        {"id": attendance["id"]},
-        {"$set": {
+    # Working hours are computed from the stored check-in time inside the update pipeline
+    check_in_parts = {"$split": ["$check_in", ":"]}
+    out_hour, out_minute = (int(part) for part in now.split(":"))
+    hours_worked = {"$add": [
+        {"$subtract": [out_hour, {"$toInt": {"$arrayElemAt": [check_in_parts, 0]}}]},
+        {"$divide": [{"$subtract": [out_minute, {"$toInt": {"$arrayElemAt": [check_in_parts, 1]}}]}, 60]}
+    ]}
+    
+    updated = await db.attendance.find_one_and_update(
+        {"employee_id": current_user["id"], "date": today, "check_out": None},
+        [{"$set": {
             "check_out": now,
-            "working_hours": round(hours_worked, 2),
+            "working_hours": {"$round": [hours_worked, 2]},
             "is_early_out": is_early
+        }}],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        attendance = await db.attendance.find_one({"employee_id": current_user["id"], "date": today}, {"_id": 1})
+        if not attendance:
+            raise HTTPException(status_code=400, detail="No check-in record found")
+        raise HTTPException(status_code=400, detail="Already checked out")
+    # Check-out only ever fills these three fields on an open record
+    before = {**updated, "check_out": None, "working_hours": None, "is_early_out": False}
+    await apply_attendance_rollup(before, updated)
+    attendance_feed.publish_local("check_out", updated)
+    return updated
+
+def clock_minutes(value) -> dict:
+    parts = {"$split": [value, ":"]}
+    return {"$add": [
+        {"$multiply": [{"$toInt": {"$arrayElemAt": [parts, 0]}}, 60]},
+        {"$toInt": {"$arrayElemAt": [parts, 1]}}
+    ]}
+
+# First-in/last-out merge of a batch's punches into the stored (employee_id, date) record; runs as
+# an upsert pipeline so punches already on file (or a manual check-in) take part in the min/max
+def punch_merge_pipeline(group: dict, office_start: str, office_end: str) -> list:
+    first, last = group["first"], group["last"]
+    return [
+        {"$set": {
+            "id": {"$ifNull": ["$id", str(uuid.uuid4())]},
+            "method": {"$ifNull": ["$method", {"$literal": group["method"]}]},
+            "location": {"$ifNull": ["$location", {"$literal": group["location"]}]},
+            "check_in": {"$min": [{"$ifNull": ["$check_in", first]}, first]},
+            "check_out": {"$max": [{"$ifNull": ["$check_out", {"$ifNull": ["$check_in", last]}]}, last]}
+        }},
+        {"$set": {
+            "check_out": {"$cond": [{"$gt": ["$check_out", "$check_in"]}, "$check_out", None]},
+            "is_late": {"$gt": ["$check_in", office_start]},
+            "status": {"$cond": [{"$gt": ["$check_in", office_start]}, "Late", "Present"]}
+        }},
+        {"$set": {
+            "is_early_out": {"$and": [{"$ne": ["$check_out", None]}, {"$lt": ["$check_out", office_end]}]},
+            "working_hours": {"$cond": [
+                {"$eq": ["$check_out", None]},
+                None,
+                {"$round": [{"$divide": [{"$subtract": [clock_minutes("$check_out"), clock_minutes("$check_in")]}, 60]}, 2]}
+            ]}
         }}
+    ]
+
+def parse_punch(line: bytes) -> dict:
+    try:
+        punch = AttendancePunch.model_validate_json(line)
+    except ValidationError as e:
+        raise ValueError(validation_message(e))
+    if punch.timestamp:
+        stamp = punch.timestamp.astimezone(timezone.utc) if punch.timestamp.tzinfo else punch.timestamp
+        date, clock = stamp.strftime("%Y-%m-%d"), stamp.strftime("%H:%M")
+    elif punch.date and punch.time:
+        date, clock = punch.date, punch.time
+    else:
+        raise ValueError("timestamp or date and time required")
+    if not (punch.employee_id or punch.employee_code):
+        raise ValueError("employee_id or employee_code required")
+    return {
+        "employee_id": punch.employee_id,
+        "employee_code": punch.employee_code,
+        "date": date,
+        "time": clock,
+        "method": punch.method,
+        "location": punch.location
+    }
+
+@api_router.post("/attendance/bulk")
+async def bulk_attendance(request: Request, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Only admin can upload attendance")
+    
+    results, punches = [], []
+    async for line_no, line in read_ndjson_lines(request):
+        if len(results) + len(punches) >= ATTENDANCE_BULK_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"At most {ATTENDANCE_BULK_MAX_ROWS} punches per upload")
+        try:
+            punches.append({"line": line_no, **parse_punch(line)})
+        except ValueError as e:
+            results.append({"line": line_no, "status": "rejected", "error": str(e)})
+    
+    # Door readers know badge codes; resolve them (and check raw ids) in two round-trips
+    ids = list({p["employee_id"] for p in punches if p["employee_id"]})
+    codes = list({p["employee_code"] for p in punches if not p["employee_id"]})
+    by_id, by_code = await asyncio.gather(
+        db.employees.find({"id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(None),
+        db.employees.find({"employee_id": {"$in": codes}}, {"_id": 0, "id": 1, "employee_id": 1}).to_list(None)
     )
+    known_ids = {emp["id"] for emp in by_id}
+    code_ids = {emp["employee_id"]: emp["id"] for emp in by_code}
+    
+    groups = {}
+    for punch in punches:
+        if punch["employee_id"]:
+            employee_id = punch["employee_id"] if punch["employee_id"] in known_ids else None
+        else:
+            employee_id = code_ids.get(punch["employee_code"])
+        if employee_id is None:
+            results.append({"line": punch["line"], "status": "rejected", "error": "Unknown employee"})
+            continue
+        group = groups.get((employee_id, punch["date"]))
+        if group is None:
+            group = groups[(employee_id, punch["date"])] = {
+                "first": punch["time"], "last": punch["time"],
+                "method": punch["method"], "location": punch["location"], "lines": []
+            }
+        group["first"] = min(group["first"], punch["time"])
+        group["last"] = max(group["last"], punch["time"])
+        group["location"] = group["location"] or punch["location"]
+        group["lines"].append(punch["line"])
+    
+    settings = await settings_cache.get()
+    office_start = settings.get("office_start_time", "09:00")
+    office_end = settings.get("office_end_time", "18:00")
+    keys = list(groups)
+    operations = [
+        UpdateOne({"employee_id": employee_id, "date": date}, punch_merge_pipeline(groups[(employee_id, date)], office_start, office_end), upsert=True)
+        for employee_id, date in keys
+    ]
+    
+    # Unordered: one bad record (e.g. a concurrent upsert race) doesn't stop the rest of the batch
+    outcome = {}
+    if operations:
+        try:
+            outcome = (await db.attendance.bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            outcome = e.details
+    failed = {error["index"]: error.get("errmsg", "Write failed") for error in outcome.get("writeErrors", [])}
+    
+    written = []
+    for index, (employee_id, date) in enumerate(keys):
+        for line_no in groups[(employee_id, date)]["lines"]:
+            if index in failed:
+                results.append({"line": line_no, "status": "failed", "employee_id": employee_id, "date": date, "error": failed[index]})
+            else:
+                results.append({"line": line_no, "status": "accepted", "employee_id": employee_id, "date": date})
+        if index not in failed:
+            written.append({"employee_id": employee_id, "date": date})
+    results.sort(key=lambda row: row["line"])
+    
+    if written:
+        await rebuild_attendance_rollups(sorted({(w["employee_id"], w["date"][:7]) for w in written}))
+        if attendance_feed.subscribers and not attendance_feed.watching:
+            async for att in db.attendance.find({"$or": written}, {"_id": 0}):
+                attendance_feed.publish_local("update", att)
     
-    updated = await db.attendance.find_one({"id": attendance["id"]}, {"_id": 0})
-    return updated
+    return {
+        "received": len(results),
+        "accepted": sum(1 for row in results if row["status"] == "accepted"),
+        # Rejected lines were invalid as sent; failed ones were valid but their write did not go through
+        "rejected": sum(1 for row in results if row["status"] == "rejected"),
+        "failed": sum(1 for row in results if row["status"] == "failed"),
+        "records": len(written),
+        "upserted": outcome.get("nUpserted", 0),
+        "modified": outcome.get("nModified", 0),
+        "results": results
+    }
+
+@api_router.get("/attendance/monthly")
+async def get_attendance_monthly(
+    month: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    fields: Optional[list] = Depends(fields_param),
+    current_user: dict = Depends(get_current_user)
+):
+    query = {}
+    if month:
+        query["month"] = month
+    if employee_id:
+        query["employee_id"] = employee_id
+    
+    if current_user["role"] == "EMPLOYEE":
+        query["employee_id"] = current_user["id"]
+    
+    return await db.attendance_monthly.find(query, field_projection(fields, {"_id": 0})).to_list(None)
+
+@api_router.post("/attendance/monthly/rebuild")
+async def rebuild_attendance_monthly(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Only admin can rebuild attendance rollups")
+    
+    started = time.perf_counter()
+    await rebuild_attendance_rollups()
+    return {
+        "message": "Attendance rollups rebuilt",
+        "rollups": await db.attendance_monthly.count_documents({}),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+# ============== LEAVE LEDGER ==============
+
+# leave_balances keeps used/pending working days per (employee_id, year, type) for the leave_policy types.
+# Each leave records the days it counts for (ledger_type, ledger_days by year) when it is filed, so later
+# status changes move exactly those days even if the holiday calendar has changed in between.
+LEAVE_LEDGER_FIELDS = {"Pending": "pending", "Approved": "used"}
+
+def leave_ledger_fields(leave: dict, settings: dict) -> dict:
+    key = leave_policy_key(leave.get("type"), settings.get("leave_policy") or {})
+    if key is None:
+        return {"ledger_type": None, "ledger_days": {}}
+    start = np.datetime64(leave["start_date"], "D")
+    end = np.datetime64(leave["end_date"], "D") + 1
+    if end <= start:
+        raise ValueError("end_date is before start_date")
+    
+    weekmask, holidays = working_calendar(settings)
+    days = {}
+    for year in range(int(str(start)[:4]), int(str(end - 1)[:4]) + 1):
+        year_start = max(start, np.datetime64(f"{year}-01-01"))
+        year_end = min(end, np.datetime64(f"{year + 1}-01-01"))
+        count = int(np.busday_count(year_start, year_end, weekmask=weekmask, holidays=holidays))
+        if count:
+            days[str(year)] = count
+    return {"ledger_type": key, "ledger_days": days}
+
+def leave_ledger_deltas(before: Optional[dict], after: Optional[dict]) -> dict:
+    deltas = defaultdict(lambda: defaultdict(int))
+    for leave, sign in ((before, -1), (after, 1)):
+        field = LEAVE_LEDGER_FIELDS.get((leave or {}).get("status"))
+        if field and leave.get("ledger_type"):
+            for year, days in leave["ledger_days"].items():
+                deltas[(leave["employee_id"], year, leave["ledger_type"])][field] += sign * days
+    return deltas
+
+async def apply_leave_ledger(before: Optional[dict], after: Optional[dict], settings: dict, enforce: bool = True):
+    # Growth in used + pending only lands while it fits the entitlement; a refused year undoes the ones before it.
+    # enforce=False records history as it stands, e.g. leaves approved before the ledger existed.
+    leave_policy = settings.get("leave_policy") or {}
+    applied = []
+    for (employee_id, year, leave_type), counters in leave_ledger_deltas(before, after).items():
+        inc = {field: value for field, value in counters.items() if value}
+        if not inc:
+            continue
+        key = {"employee_id": employee_id, "year": year, "type": leave_type}
+        growth = sum(inc.values())
+        if growth <= 0 or not enforce:
+            await db.leave_balances.update_one(key, {"$inc": inc}, upsert=True)
+            applied.append((key, inc))
+            continue
+        
+        entitlement = float(leave_policy.get(leave_type) or 0)
+        await db.leave_balances.update_one(key, {"$setOnInsert": {"used": 0, "pending": 0}}, upsert=True)
+        result = await db.leave_balances.update_one(
+            {**key, "$expr": {"$lte": [{"$add": ["$used", "$pending", growth]}, entitlement]}},
+            {"$inc": inc}
+        )
+        if result.matched_count == 0:
+            for done_key, done_inc in applied:
+                await db.leave_balances.update_one(done_key, {"$inc": {f: -v for f, v in done_inc.items()}})
+            balance = await db.leave_balances.find_one(key, {"_id": 0, "used": 1, "pending": 1}) or {}
+            available = max(entitlement - balance.get("used", 0) - balance.get("pending", 0), 0)
+            raise HTTPException(
+                status_code=400,
+                detail=f"Insufficient {leave_type} leave for {year}: {available:g} day(s) available, {growth} requested"
+            )
+        applied.append((key, inc))
+
+LEAVE_LEDGER_PROJECTION = {"_id": 0, "id": 1, "employee_id": 1, "type": 1, "status": 1, "start_date": 1, "end_date": 1}
+
+def stored_leave_ledger_fields(leave: dict, settings: dict) -> Optional[dict]:
+    # For leaves already on file: unreadable dates leave them untracked instead of failing; None means untracked
+    try:
+        return leave_ledger_fields(leave, settings)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+async def ensure_leave_ledger(leave: dict, settings: dict) -> dict:
+    # Leaves filed before the ledger existed carry no ledger fields and were never counted. The first caller
+    # to stamp the fields (the $exists filter admits only one) also counts the leave as it stands.
+    if "ledger_type" in leave:
+        return leave
+    fields = stored_leave_ledger_fields(leave, settings) or {"ledger_type": None, "ledger_days": {}}
+    result = await db.leaves.update_one({"id": leave["id"], "ledger_type": {"$exists": False}}, {"$set": fields})
+    if result.modified_count:
+        await apply_leave_ledger(None, {**leave, **fields}, settings, enforce=False)
+        return {**leave, **fields}
+    return await db.leaves.find_one({"id": leave["id"]}, {"_id": 0}) or {**leave, **fields}
+
+async def backfill_leave_ledger() -> int:
+    # Runs at startup; a no-op once every leave has been stamped
+    settings = await settings_cache.get()
+    count = 0
+    async for leave in db.leaves.find({"ledger_type": {"$exists": False}}, LEAVE_LEDGER_PROJECTION):
+        await ensure_leave_ledger(leave, settings)
+        count += 1
+    if count:
+        logger.info(f"Counted {count} leaves filed before the leave ledger")
+    return count
+
+async def rebuild_leave_balances() -> dict:
+    # Recomputes every leave's ledger days against the current calendar, then the balances from those
+    settings = await settings_cache.get()
+    stamp = datetime.now(timezone.utc).isoformat()
+    totals = defaultdict(lambda: defaultdict(int))
+    operations, leaves, invalid = [], 0, 0
+    async for leave in db.leaves.find({}, LEAVE_LEDGER_PROJECTION).batch_size(STREAM_BATCH_SIZE):
+        leaves += 1
+        fields = stored_leave_ledger_fields(leave, settings)
+        if fields is None:
+            invalid += 1
+            fields = {"ledger_type": None, "ledger_days": {}}
+        operations.append(UpdateOne({"id": leave["id"]}, {"$set": fields}))
+        for key, counters in leave_ledger_deltas(None, {**leave, **fields}).items():
+            for field, value in counters.items():
+                totals[key][field] += value
+        if len(operations) >= STREAM_BATCH_SIZE:
+            await db.leaves.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        await db.leaves.bulk_write(operations, ordered=False)
+    
+    balances = [
+        UpdateOne(
+            {"employee_id": employee_id, "year": year, "type": leave_type},
+            {"$set": {"used": counters["used"], "pending": counters["pending"], "rebuilt_at": stamp}},
+            upsert=True
+        )
+        for (employee_id, year, leave_type), counters in totals.items()
+    ]
+    for offset in range(0, len(balances), STREAM_BATCH_SIZE):
+        await db.leave_balances.bulk_write(balances[offset:offset + STREAM_BATCH_SIZE], ordered=False)
+    await db.leave_balances.delete_many({"rebuilt_at": {"$ne": stamp}})
+    return {"leaves": leaves, "invalid_dates": invalid, "balances": len(balances)}
 
 # ============== LEAVE ROUTES ==============
 
@@ -483,6 +2458,8 @@ async def check_out(data: dict, current_user: dict = Depends(get_current_user)):
 async def get_leaves(
     employee_id: Optional[str] = None,
     status: Optional[str] = None,
+    page: dict = Depends(page_params),
+    fields: Optional[list] = Depends(fields_param),
     current_user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -494,8 +2471,57 @@ async def get_leaves(
     if current_user["role"] == "EMPLOYEE":
         query["employee_id"] = current_user["id"]
     
-    leaves = await db.leaves.find(query, {"_id": 0}).to_list(1000)
-    return leaves
+    return await list_documents(db.leaves, query, field_projection(fields, {}), page)
+
+@api_router.get("/leaves/balances")
+async def get_leave_balances(
+    employee_id: Optional[str] = None,
+    year: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] == "EMPLOYEE":
+        employee_id = current_user["id"]
+    year = year or datetime.now(timezone.utc).strftime("%Y")
+    leave_policy = (await settings_cache.get()).get("leave_policy") or {}
+    
+    query = {"year": year}
+    if employee_id:
+        query["employee_id"] = employee_id
+    docs = await db.leave_balances.find(query, {"_id": 0, "employee_id": 1, "type": 1, "used": 1, "pending": 1}).to_list(None)
+    balances = {(doc["employee_id"], doc["type"]): doc for doc in docs}
+    # A single employee gets a row for every policy type, taken or not
+    if employee_id:
+        for leave_type in leave_policy:
+            balances.setdefault((employee_id, leave_type), {"employee_id": employee_id, "type": leave_type})
+    
+    rows = []
+    for (emp_id, leave_type), doc in balances.items():
+        entitlement = float(leave_policy.get(leave_type) or 0)
+        used, pending = doc.get("used", 0), doc.get("pending", 0)
+        rows.append({
+            "employee_id": emp_id,
+            "year": year,
+            "type": leave_type,
+            "entitlement": entitlement,
+            "used": used,
+            "pending": pending,
+            "remaining": entitlement - used,
+            "available": entitlement - used - pending
+        })
+    return rows
+
+@api_router.post("/leaves/balances/rebuild")
+async def rebuild_leave_balances_route(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Only admin can rebuild leave balances")
+    
+    started = time.perf_counter()
+    result = await rebuild_leave_balances()
+    return {
+        "message": "Leave balances rebuilt",
+        **result,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
 
 @api_router.post("/leaves")
 async def create_leave(leave: LeaveCreate, current_user: dict = Depends(get_current_user)):
@@ -503,26 +2529,59 @@ async def create_leave(leave: LeaveCreate, current_user: dict = Depends(get_curr
     leave_dict["id"] = str(uuid.uuid4())
     leave_dict["request_date"] = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     
-    await db.leaves.insert_one(leave_dict)
+    settings = await settings_cache.get()
+    try:
+        leave_dict.update(leave_ledger_fields(leave_dict, settings))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid leave dates")
+    # Reserves the days as pending, or refuses the request if the balance can't cover them
+    await apply_leave_ledger(None, leave_dict, settings)
+    
+    try:
+        await db.leaves.insert_one(leave_dict)
+    except PyMongoError:
+        await apply_leave_ledger(leave_dict, None, settings)
+        raise
     return {k: v for k, v in leave_dict.items() if k != "_id"}
 
 @api_router.put("/leaves/{leave_id}")
 async def update_leave(leave_id: str, update: dict, current_user: dict = Depends(get_current_user)):
+    before = await db.leaves.find_one({"id": leave_id}, {"_id": 0})
+    if not before:
+        raise HTTPException(status_code=404, detail="Leave not found")
     if current_user["role"] != "ADMIN" and current_user["role"] != "LEAD":
         # Employees can only cancel pending leaves
-        leave = await db.leaves.find_one({"id": leave_id})
-        if leave["employee_id"] != current_user["id"] or leave["status"] != "Pending":
+        if before["employee_id"] != current_user["id"] or before["status"] != "Pending":
             raise HTTPException(status_code=403, detail="Not authorized")
     
-    update_data = {k: v for k, v in update.items() if v is not None}
-    await db.leaves.update_one({"id": leave_id}, {"$set": update_data})
-    
-    leave = await db.leaves.find_one({"id": leave_id}, {"_id": 0})
-    return leave
+    update_data = {k: v for k, v in update.items() if v is not None and k not in ("_id", "id", "ledger_type", "ledger_days")}
+    settings = await settings_cache.get()
+    before = await ensure_leave_ledger(before, settings)
+    after = {**before, **update_data}
+    if any(field in update_data for field in ("type", "start_date", "end_date")):
+        try:
+            update_data.update(leave_ledger_fields(after, settings))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid leave dates")
+        after.update(update_data)
+    if not update_data:
+        return before
+    
+    # Compare-and-set on the fields the ledger depends on, so concurrent approvals can't both count
+    guard = {field: before.get(field) for field in ("status", "type", "start_date", "end_date")}
+    result = await db.leaves.update_one({"id": leave_id, **guard}, {"$set": update_data})
+    if result.matched_count == 0:
+        raise HTTPException(status_code=409, detail="Leave was changed by someone else, reload and retry")
+    try:
+        await apply_leave_ledger(before, after, settings)
+    except HTTPException:
+        await db.leaves.update_one({"id": leave_id}, {"$set": {k: before.get(k) for k in update_data}})
+        raise
+    return after
 
 @api_router.delete("/leaves/{leave_id}")
 async def delete_leave(leave_id: str, current_user: dict = Depends(get_current_user)):
-    leave = await db.leaves.find_one({"id": leave_id})
+    leave = await db.leaves.find_one({"id": leave_id}, {"_id": 0})
     if not leave:
         raise HTTPException(status_code=404, detail="Leave not found")
     
@@ -530,7 +2589,11 @@ async def delete_leave(leave_id: str, current_user: dict = Depends(get_current_u
         if leave["employee_id"] != current_user["id"] or leave["status"] != "Pending":
             raise HTTPException(status_code=403, detail="Not authorized")
     
-    await db.leaves.delete_one({"id": leave_id})
+    settings = await settings_cache.get()
+    leave = await ensure_leave_ledger(leave, settings)
+    result = await db.leaves.delete_one({"id": leave_id})
+    if result.deleted_count:
+        await apply_leave_ledger(leave, None, settings)
     return {"message": "Leave deleted"}
 
 # ============== FINE ROUTES ==============
@@ -538,6 +2601,9 @@ async def delete_leave(leave_id: str, current_user: dict = Depends(get_current_u
 @api_router.get("/fines")
 async def get_fines(
     employee_id: Optional[str] = None,
+    page: dict = Depends(page_params),
+    fields: Optional[list] = Depends(fields_param),
+    lookup: Optional[list] = Depends(expand_params),
     current_user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -547,8 +2613,7 @@ async def get_fines(
     if current_user["role"] == "EMPLOYEE":
         query["employee_id"] = current_user["id"]
     
-    fines = await db.fines.find(query, {"_id": 0}).to_list(1000)
-    return fines
+    return await list_documents(db.fines, query, field_projection(fields, {}), page, lookup)
 
 @api_router.post("/fines")
 async def create_fine(fine: FineCreate, current_user: dict = Depends(get_current_user)):
@@ -583,6 +2648,8 @@ async def delete_fine(fine_id: str, current_user: dict = Depends(get_current_use
 async def get_appeals(
     employee_id: Optional[str] = None,
     status: Optional[str] = None,
+    page: dict = Depends(page_params),
+    fields: Optional[list] = Depends(fields_param),
     current_user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -594,8 +2661,7 @@ async def get_appeals(
     if current_user["role"] == "EMPLOYEE":
         query["employee_id"] = current_user["id"]
     
-    appeals = await db.appeals.find(query, {"_id": 0}).to_list(1000)
-    return appeals
+    return await list_documents(db.appeals, query, field_projection(fields, {}), page)
 
 @api_router.post("/appeals")
 async def create_appeal(appeal: AppealCreate, current_user: dict = Depends(get_current_user)):
@@ -622,6 +2688,9 @@ async def update_appeal(appeal_id: str, update: dict, current_user: dict = Depen
 async def get_payroll(
     month: Optional[str] = None,
     year: Optional[str] = None,
+    page: dict = Depends(page_params),
+    fields: Optional[list] = Depends(fields_param),
+    lookup: Optional[list] = Depends(expand_params),
     current_user: dict = Depends(get_current_user)
 ):
     query = {}
@@ -633,62 +2702,65 @@ async def get_payroll(
     if current_user["role"] == "EMPLOYEE":
         query["employee_id"] = current_user["id"]
     
-    payroll = await db.payroll.find(query, {"_id": 0}).to_list(1000)
-    return payroll
+    return await list_documents(reporting_db.payroll, query, field_projection(fields, {}), page, lookup)
+
+@api_router.get("/payroll/sheet")
+async def get_payroll_sheet(
+    month: Optional[str] = None,
+    year: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Only admin can view the payroll sheet")
+    
+    month = month or datetime.now(timezone.utc).strftime("%m")
+    year = year or datetime.now(timezone.utc).strftime("%Y")
+    settings = await settings_cache.get()
+    payslip_projection = {"_id": 0, "employee_id": 1, "status": 1, **{field: 1 for field in PAYSLIP_FIELDS}}
+    employees, payroll = await asyncio.gather(
+        db.employees.find({"role": "EMPLOYEE"}, employee_summary_projection("salary")).to_list(None),
+        db.payroll.find({"month": month, "year": year}, payslip_projection).to_list(None)
+    )
+    inputs = await load_payroll_inputs([emp["id"] for emp in employees], settings, month, year)
+    frame = await asyncio.to_thread(calculate_payroll, employees, *inputs, settings, month, year)
+    
+    # Paid rows show the payslip that was paid; the rest preview exactly what run_payroll would pay now
+    preview = dict(zip(frame.index, frame[PAYSLIP_FIELDS].to_dict("records")))
+    payslips = {p["employee_id"]: p for p in payroll}
+    rows = []
+    for emp in employees:
+        payslip = payslips.get(emp["id"]) or {}
+        breakdown = payslip if payslip.get("status") == "Paid" and "net_salary" in payslip else preview[emp["id"]]
+        rows.append({
+            **emp,
+            **{field: breakdown.get(field) for field in PAYSLIP_FIELDS},
+            "unpaid_fines": preview[emp["id"]]["fine_deduction"],
+            "status": payslip.get("status")
+        })
+    return ORJSONResponse(rows)
 
 @api_router.post("/payroll/process")
-async def process_payroll(data: dict, current_user: dict = Depends(get_current_user)):
+async def process_payroll(data: dict, response: Response, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "ADMIN":
         raise HTTPException(status_code=403, detail="Only admin can process payroll")
     
     month = data.get("month", datetime.now(timezone.utc).strftime("%m"))
     year = data.get("year", datetime.now(timezone.utc).strftime("%Y"))
     
-    employees = await db.employees.find({"role": "EMPLOYEE"}, {"_id": 0}).to_list(1000)
-    
-    for emp in employees:
-        # Get fines for this employee
-        fines = await db.fines.find({
-            "employee_id": emp["id"],
-            "status": "Unpaid"
-        }, {"_id": 0}).to_list(100)
-        total_fines = sum(f["amount"] for f in fines)
-        
-        # Get leave deductions
-        leaves = await db.leaves.find({
-            "employee_id": emp["id"],
-            "status": "Approved"
-        }, {"_id": 0}).to_list(100)
-        
-        base_salary = emp.get("salary", 0)
-        deductions = total_fines
-        net_salary = base_salary - deductions
-        
-        payroll_record = {
-            "id": str(uuid.uuid4()),
-            "employee_id": emp["id"],
-            "month": month,
-            "year": year,
-            "base_salary": base_salary,
-            "deductions": deductions,
-            "net_salary": net_salary,
-            "status": "Paid"
-        }
-        
-        # Update or insert payroll record
-        await db.payroll.update_one(
-            {"employee_id": emp["id"], "month": month, "year": year},
-            {"$set": payroll_record},
-            upsert=True
-        )
-        
-        # Mark fines as paid
-        await db.fines.update_many(
-            {"employee_id": emp["id"], "status": "Unpaid"},
-            {"$set": {"status": "Paid"}}
+    if data.get("background"):
+        # Retries while a run for the same month is in flight get that job back
+        job = await job_runner.submit(
+            "payroll", {"month": month, "year": year}, current_user["id"], dedupe_key=f"payroll:{year}-{month}"
         )
+        response.status_code = 202
+        return job
     
-    return {"message": "Payroll processed successfully"}
+    result = await run_payroll(month, year, {"role": "EMPLOYEE"})
+    return {
+        "message": "Payroll processed successfully",
+        "processed": len(result["payslips"]),
+        "timings": result["timings"]
+    }
 
 @api_router.post("/payroll/pay/{employee_id}")
 async def pay_employee(employee_id: str, current_user: dict = Depends(get_current_user)):
@@ -698,87 +2770,610 @@ async def pay_employee(employee_id: str, current_user: dict = Depends(get_curren
     month = datetime.now(timezone.utc).strftime("%m")
     year = datetime.now(timezone.utc).strftime("%Y")
     
-    employee = await db.employees.find_one({"id": employee_id}, {"_id": 0})
-    if not employee:
+    result = await run_payroll(month, year, {"id": employee_id})
+    if not result["payslips"]:
         raise HTTPException(status_code=404, detail="Employee not found")
     
-    # Get fines for this employee
-    fines = await db.fines.find({
-        "employee_id": employee_id,
-        "status": "Unpaid"
-    }, {"_id": 0}).to_list(100)
-    total_fines = sum(f["amount"] for f in fines)
-    
-    base_salary = employee.get("salary", 0)
-    deductions = total_fines
-    net_salary = base_salary - deductions
-    
-    payroll_record = {
-        "id": str(uuid.uuid4()),
-        "employee_id": employee_id,
-        "month": month,
-        "year": year,
-        "base_salary": base_salary,
-        "deductions": deductions,
-        "net_salary": net_salary,
-        "status": "Paid"
-    }
-    
-    # Update or insert payroll record
-    await db.payroll.update_one(
-        {"employee_id": employee_id, "month": month, "year": year},
-        {"$set": payroll_record},
-        upsert=True
-    )
+    payslip = result["payslips"][0]
+    return {"message": f"Salary paid to {payslip['employee_name']}", "net_salary": payslip["net_salary"]}
+
+PAYROLL_COMMITTED_PHASES = ("write_payslips", "settle_fines")
+
+@job_handler("payroll")
+async def payroll_job(ctx: JobContext) -> dict:
+    month, year = ctx.params["month"], ctx.params["year"]
     
-    # Mark fines as paid
-    await db.fines.update_many(
-        {"employee_id": employee_id, "status": "Unpaid"},
-        {"$set": {"status": "Paid"}}
-    )
+    async def on_phase(name: str, elapsed_ms: float):
+        # From the payslip write on, the run is committed: stopping before its fines are settled would
+        # leave them deducted yet Unpaid, so a late cancel is ignored and the run reports its real outcome
+        await ctx.record_phase(name, elapsed_ms, final=name in PAYROLL_COMMITTED_PHASES)
     
-    return {"message": f"Salary paid to {employee['name']}", "net_salary": net_salary}
+    result = await run_payroll(month, year, {"role": "EMPLOYEE"}, on_phase=on_phase)
+    return {"processed": len(result["payslips"]), "month": month, "year": year}
 
 @api_router.get("/payroll/status")
-async def get_payroll_status(current_user: dict = Depends(get_current_user)):
+async def get_payroll_status(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     month = datetime.now(timezone.utc).strftime("%m")
     year = datetime.now(timezone.utc).strftime("%Y")
     
+    etag = make_etag(request, current_user, "payroll", await collection_versions.get("payroll"), month, year)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    with_etag(response, etag)
+    
     query = {"month": month, "year": year}
     if current_user["role"] == "EMPLOYEE":
         query["employee_id"] = current_user["id"]
     
-    payroll = await db.payroll.find(query, {"_id": 0}).to_list(1000)
-    status_dict = {p["employee_id"]: p["status"] for p in payroll}
-    return status_dict
+    async def load_statuses():
+        payroll = await db.payroll.find(query, {"_id": 0, "employee_id": 1, "status": 1}).to_list(None)
+        return {p["employee_id"]: p["status"] for p in payroll}
+    
+    scope = query.get("employee_id", "all")
+    return await single_flight.do("get_payroll_status", scope, (month, year), load_statuses)
+
+# ============== ATTENDANCE ROLLUPS ==============
+
+PRESENT_STATUSES = ["Present", "Late"]
+
+# Per employee and month ("YYYY-MM"): how a single attendance row counts towards attendance_monthly
+def rollup_contribution(att: dict) -> dict:
+    return {
+        "days": 1,
+        "present": 1 if att.get("status") in PRESENT_STATUSES else 0,
+        "late": 1 if att.get("is_late") else 0,
+        "early_out": 1 if att.get("is_early_out") else 0,
+        "absent": 1 if att.get("status") == "Absent" else 0,
+        "working_hours": att.get("working_hours") or 0
+    }
+
+async def apply_attendance_rollup(before: Optional[dict], after: Optional[dict]):
+    deltas = defaultdict(lambda: defaultdict(int))
+    for att, sign in ((before, -1), (after, 1)):
+        if att and att.get("employee_id") and att.get("date"):
+            key = (att["employee_id"], att["date"][:7])
+            for counter, value in rollup_contribution(att).items():
+                deltas[key][counter] += sign * value
+    
+    operations = []
+    for (employee_id, month), counters in deltas.items():
+        inc = {counter: value for counter, value in counters.items() if value}
+        if inc:
+            operations.append(UpdateOne({"employee_id": employee_id, "month": month}, {"$inc": inc}, upsert=True))
+    if operations:
+        await db.attendance_monthly.bulk_write(operations, ordered=False)
+
+def rollup_pipeline(match: dict) -> list:
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"employee_id": "$employee_id", "month": {"$substrBytes": ["$date", 0, 7]}},
+            "days": {"$sum": 1},
+            "present": {"$sum": {"$cond": [{"$in": ["$status", PRESENT_STATUSES]}, 1, 0]}},
+            "late": {"$sum": {"$cond": ["$is_late", 1, 0]}},
+            "early_out": {"$sum": {"$cond": ["$is_early_out", 1, 0]}},
+            "absent": {"$sum": {"$cond": [{"$eq": ["$status", "Absent"]}, 1, 0]}},
+            "working_hours": {"$sum": {"$ifNull": ["$working_hours", 0]}}
+        }},
+        {"$project": {
+            "_id": 0,
+            "employee_id": "$_id.employee_id",
+            "month": "$_id.month",
+            "days": 1, "present": 1, "late": 1, "early_out": 1, "absent": 1, "working_hours": 1
+        }}
+    ]
+
+async def rebuild_attendance_rollups(pairs: Optional[List[tuple]] = None):
+    # Full rebuild replaces the collection; a partial one recomputes the given (employee_id, month) pairs
+    if pairs is None:
+        await db.attendance.aggregate(rollup_pipeline({}) + [{"$out": "attendance_monthly"}]).to_list(None)
+        return
+    if not pairs:
+        return
+    match = {"$or": [
+        {"employee_id": employee_id, "date": {"$gte": f"{month}-00", "$lte": f"{month}-99"}}
+        for employee_id, month in pairs
+    ]}
+    await db.attendance_monthly.delete_many({"$or": [{"employee_id": e, "month": m} for e, m in pairs]})
+    await db.attendance.aggregate(rollup_pipeline(match) + [{"$merge": {
+        "into": "attendance_monthly",
+        "on": ["employee_id", "month"],
+        "whenMatched": "replace",
+        "whenNotMatched": "insert"
+    }}]).to_list(None)
+
+# ============== PAYROLL ENGINE ==============
+
+# Leave types as the app submits them ("Annual", "Self Wedding") mapped onto leave_policy keys;
+# anything outside the policy is unpaid
+def leave_policy_key(leave_type: Optional[str], leave_policy: dict) -> Optional[str]:
+    normalized = (leave_type or "").strip().lower()
+    if normalized in leave_policy:
+        return normalized
+    for key in leave_policy:
+        if key in normalized.split():
+            return key
+    return None
+
+def month_bounds(month: str, year: str):
+    start = np.datetime64(f"{int(year):04d}-{int(month):02d}-01")
+    end = (start.astype("datetime64[M]") + 1).astype("datetime64[D]")
+    return start, end
+
+# Working days for np.busday_count: salary_settings.weekmask (Mon..Sun) and the holiday calendar
+def working_calendar(settings: dict) -> tuple:
+    weekmask = (settings.get("salary_settings") or {}).get("weekmask", "1111100")
+    holidays = [h for h in settings.get("holidays") or [] if h]
+    return weekmask, holidays
+
+# Attendance-based deductions are opt-in per salary_settings flag; fines are always deducted
+PAYROLL_DEDUCTION_FLAGS = ("deduct_late", "deduct_half_days", "deduct_unpaid_leave", "deduct_absences")
+# Fines recorded for lateness; a late day that already has one is not charged late_fine_amount again
+LATE_FINE_REASON_RE = r"\blate\b"
+
+def calculate_payroll(employees: list, fines: list, attendance: list, leaves: list, late_fines: list,
+                      settings: dict, month: str, year: str) -> pd.DataFrame:
+    salary_settings = settings.get("salary_settings") or {}
+    leave_policy = settings.get("leave_policy") or {}
+    weekmask, holidays = working_calendar(settings)
+    
+    month_start, month_end = month_bounds(month, year)
+    working_days = int(np.busday_count(month_start, month_end, weekmask=weekmask, holidays=holidays))
+    
+    frame = pd.DataFrame.from_records(employees, columns=["id", "name", "salary"], index="id")
+    frame["salary"] = pd.to_numeric(frame["salary"], errors="coerce").fillna(0.0)
+    frame = frame.join(
+        pd.DataFrame.from_records(fines, columns=["_id", "total"], index="_id").rename(columns={"total": "fine_deduction"})
+    ).join(
+        pd.DataFrame.from_records(attendance, columns=["_id", "half_days", "absent_days"], index="_id")
+    )
+    
+    # Late days, and which of them already carry a late fine
+    late = pd.DataFrame.from_records(attendance, columns=["_id", "late_dates"]).explode("late_dates").dropna()
+    late.columns = ["employee_id", "date"]
+    fined = pd.DataFrame.from_records(late_fines, columns=["employee_id", "date"]).drop_duplicates()
+    late = late.merge(fined, on=["employee_id", "date"], how="left", indicator=True)
+    frame["late_count"] = late.groupby("employee_id").size()
+    frame["late_fined_days"] = late[late["_merge"] == "both"].groupby("employee_id").size()
+    
+    # Approved leave outside the policy, clipped to this month and counted in working days
+    leave_frame = pd.DataFrame.from_records(leaves, columns=["employee_id", "type", "start_date", "end_date"])
+    leave_frame = leave_frame[leave_frame["type"].map(lambda t: leave_policy_key(t, leave_policy) is None).astype(bool)]
+    starts = pd.to_datetime(leave_frame["start_date"], errors="coerce").to_numpy().astype("datetime64[D]")
+    ends = pd.to_datetime(leave_frame["end_date"], errors="coerce").to_numpy().astype("datetime64[D]")
+    valid = ~(np.isnat(starts) | np.isnat(ends))
+    starts = np.maximum(starts[valid], month_start)
+    ends = np.maximum(np.minimum(ends[valid] + 1, month_end), starts)
+    unpaid_days = np.busday_count(starts, ends, weekmask=weekmask, holidays=holidays)
+    frame["unpaid_leave_days"] = pd.Series(unpaid_days, index=leave_frame["employee_id"].to_numpy()[valid]).groupby(level=0).sum()
+    
+    counts = ["late_count", "late_fined_days", "half_days", "absent_days", "unpaid_leave_days"]
+    frame[counts] = frame[counts].apply(pd.to_numeric).fillna(0).astype(int)
+    frame["fine_deduction"] = pd.to_numeric(frame["fine_deduction"]).fillna(0.0)
+    
+    daily_rate = frame["salary"] / working_days if working_days else frame["salary"] * 0
+    late_fine = float(settings.get("late_fine_amount") or 0)
+    components = {
+        "late_deduction": ("deduct_late", (frame["late_count"] - frame["late_fined_days"]) * late_fine),
+        "half_day_deduction": ("deduct_half_days", frame["half_days"] * 0.5 * daily_rate),
+        "leave_deduction": ("deduct_unpaid_leave", frame["unpaid_leave_days"] * daily_rate),
+        "absent_deduction": ("deduct_absences", frame["absent_days"] * daily_rate)
+    }
+    for column, (flag, amount) in components.items():
+        frame[column] = amount.round(2) if salary_settings.get(flag, False) else 0.0
+    
+    deduction_columns = ["fine_deduction", *components]
+    frame["working_days"] = working_days
+    frame["payable_days"] = (
+        working_days - frame["absent_days"] - frame["unpaid_leave_days"] - 0.5 * frame["half_days"]
+    ).clip(lower=0)
+    frame["deductions"] = frame[deduction_columns].sum(axis=1).round(2)
+    frame["net_salary"] = (frame["salary"] - frame["deductions"]).round(2)
+    return frame.rename(columns={"salary": "base_salary"})
+
+async def load_payroll_inputs(employee_ids: list, settings: dict, month: str, year: str) -> tuple:
+    # Month inputs are grouped per employee server-side: one round-trip per collection, not per employee
+    if not employee_ids:
+        return [], [], [], []
+    month_start, month_end = month_bounds(month, year)
+    first_day = str(month_start)
+    last_day = str(month_end - 1)
+    half_day_hours = settings.get("half_day_hours", 4)
+    fines_pipeline = [
+        {"$match": {"employee_id": {"$in": employee_ids}, "status": "Unpaid"}},
+        {"$group": {"_id": "$employee_id", "total": {"$sum": "$amount"}, "fine_ids": {"$push": "$id"}}}
+    ]
+    attendance_pipeline = [
+        {"$match": {"employee_id": {"$in": employee_ids}, "date": {"$gte": first_day, "$lte": last_day}}},
+        {"$group": {
+            "_id": "$employee_id",
+            "late_dates": {"$push": {"$cond": ["$is_late", "$date", None]}},
+            "absent_days": {"$sum": {"$cond": [{"$eq": ["$status", "Absent"]}, 1, 0]}},
+            "half_days": {"$sum": {"$cond": [{"$and": [
+                {"$in": ["$status", PRESENT_STATUSES]},
+                {"$gt": ["$working_hours", None]},
+                {"$lt": ["$working_hours", half_day_hours]}
+            ]}, 1, 0]}}
+        }}
+    ]
+    month_range = {"$gte": first_day, "$lte": last_day}
+    return await asyncio.gather(
+        db.fines.aggregate(fines_pipeline).to_list(None),
+        db.attendance.aggregate(attendance_pipeline).to_list(None),
+        db.leaves.find(
+            {"employee_id": {"$in": employee_ids}, "status": "Approved",
+             "start_date": {"$lte": last_day}, "end_date": {"$gte": first_day}},
+            {"_id": 0, "employee_id": 1, "type": 1, "start_date": 1, "end_date": 1}
+        ).to_list(None),
+        # Paid or not: a late day that was fined at the time is never charged twice
+        db.fines.find(
+            {"employee_id": {"$in": employee_ids}, "date": month_range,
+             "reason": {"$regex": LATE_FINE_REASON_RE, "$options": "i"}},
+            {"_id": 0, "employee_id": 1, "date": 1}
+        ).to_list(None)
+    )
+
+PAYSLIP_FIELDS = [
+    "base_salary", "deductions", "net_salary", "working_days", "payable_days",
+    "late_count", "late_fined_days", "half_days", "absent_days", "unpaid_leave_days",
+    "fine_deduction", "late_deduction", "half_day_deduction", "leave_deduction", "absent_deduction"
+]
+
+async def run_payroll(month: str, year: str, employee_query: dict, on_phase=None) -> dict:
+    timings = {}
+    phase_started = time.perf_counter()
+    
+    async def end_phase(name: str):
+        nonlocal phase_started
+        now = time.perf_counter()
+        timings[name] = round((now - phase_started) * 1000, 2)
+        metrics.observe("hrms_payroll_phase_seconds", {"phase": name}, now - phase_started)
+        if on_phase is not None:
+            await on_phase(name, timings[name])
+        phase_started = time.perf_counter()
+    
+    settings = await settings_cache.get()
+    employees = await db.employees.find(
+        employee_query, {"_id": 0, "id": 1, "name": 1, "salary": 1}
+    ).to_list(None)
+    await end_phase("load_employees")
+    
+    fines, attendance, leaves, late_fines = await load_payroll_inputs(
+        [emp["id"] for emp in employees], settings, month, year
+    )
+    await end_phase("aggregate_inputs")
+    
+    frame = await asyncio.to_thread(
+        calculate_payroll, employees, fines, attendance, leaves, late_fines, settings, month, year
+    )
+    payslips = []
+    operations = []
+    for employee_id, row in zip(frame.index, frame[["name", *PAYSLIP_FIELDS]].to_dict("records")):
+        payroll_record = {
+            "id": str(uuid.uuid4()),
+            "employee_id": employee_id,
+            "month": month,
+            "year": year,
+            **{field: row[field] for field in PAYSLIP_FIELDS},
+            "status": "Paid"
+        }
+        payslips.append({**payroll_record, "employee_name": row["name"]})
+        operations.append(UpdateOne(
+            {"employee_id": employee_id, "month": month, "year": year},
+            {"$set": payroll_record},
+            upsert=True
+        ))
+    await end_phase("calculate")
+    
+    if operations:
+        await db.payroll.bulk_write(operations, ordered=False)
+        await collection_versions.bump("payroll")
+    await end_phase("write_payslips")
+    
+    # Settle exactly the fines that were deducted above
+    fine_ids = [fine_id for row in fines for fine_id in row["fine_ids"]]
+    if fine_ids:
+        await db.fines.update_many(
+            {"id": {"$in": fine_ids}, "status": "Unpaid"},
+            {"$set": {"status": "Paid"}}
+        )
+    await end_phase("settle_fines")
+    
+    timings["total"] = round(sum(timings.values()), 2)
+    return {"payslips": payslips, "timings": timings}
+
+# ============== EXPORT ROUTES ==============
+
+EXPORT_EMPLOYEE_COLUMNS = [
+    ("Employee Code", "employee.employee_id"),
+    ("Name", "employee.name"),
+    ("Department", "employee.department"),
+]
+
+# (header, document path) per report; rows are joined to their employee via EMPLOYEE_LOOKUP
+EXPORT_COLUMNS = {
+    "attendance": [
+        ("Date", "date"), *EXPORT_EMPLOYEE_COLUMNS,
+        ("Status", "status"), ("Check In", "check_in"), ("Check Out", "check_out"),
+        ("Working Hours", "working_hours"), ("Late", "is_late"), ("Early Out", "is_early_out"), ("Method", "method"),
+    ],
+    "fines": [
+        ("Date", "date"), *EXPORT_EMPLOYEE_COLUMNS,
+        ("Amount", "amount"), ("Reason", "reason"), ("Status", "status"),
+    ],
+    "payroll": [
+        ("Year", "year"), ("Month", "month"), *EXPORT_EMPLOYEE_COLUMNS,
+        *((field.replace("_", " ").title(), field) for field in PAYSLIP_FIELDS),
+        ("Status", "status"),
+    ],
+}
+
+EXPORT_SORT = {
+    "attendance": {"date": 1},
+    "fines": {"date": 1},
+    "payroll": {"year": 1, "month": 1},
+}
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def export_filters(
+    start: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    end: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    month: Optional[str] = None,
+    year: Optional[str] = None,
+    department: Optional[str] = None,
+    employee_id: Optional[str] = None,
+    status: Optional[str] = None
+) -> dict:
+    filters = {
+        "start": start, "end": end, "month": month, "year": year,
+        "department": department, "employee_id": employee_id, "status": status
+    }
+    return {key: value for key, value in filters.items() if value is not None}
+
+async def export_query(report: str, filters: dict) -> dict:
+    query = {}
+    if report == "payroll":
+        for key in ("month", "year"):
+            if filters.get(key):
+                query[key] = filters[key]
+    elif filters.get("start") or filters.get("end"):
+        query["date"] = {}
+        if filters.get("start"):
+            query["date"]["$gte"] = filters["start"]
+        if filters.get("end"):
+            query["date"]["$lte"] = filters["end"]
+    if filters.get("status"):
+        query["status"] = filters["status"]
+    if filters.get("employee_id"):
+        query["employee_id"] = filters["employee_id"]
+    elif filters.get("department"):
+        members = await reporting_db.employees.find({"department": filters["department"]}, {"_id": 0, "id": 1}).to_list(None)
+        query["employee_id"] = {"$in": [emp["id"] for emp in members]}
+    return query
+
+async def export_cursor(report: str, filters: dict):
+    pipeline = [{"$match": await export_query(report, filters)}, {"$sort": EXPORT_SORT[report]}, *EMPLOYEE_LOOKUP]
+    return reporting_db[report].aggregate(pipeline, batchSize=STREAM_BATCH_SIZE, allowDiskUse=True)
+
+def export_value(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+def export_row(doc: dict, columns: list) -> list:
+    return [export_value(doc, path) for _, path in columns]
+
+FORMULA_PREFIXES = ("=", "+", "-", "@")
+
+def csv_cell(value):
+    # Reasons and names are user input; keep spreadsheets from evaluating them as formulas
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+async def csv_chunks(cursor, columns: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow([header for header, _ in columns])
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([csv_cell(value) for value in export_row(doc, columns)])
+        rows += 1
+        if rows % STREAM_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def export_filename(report: str, extension: str) -> str:
+    return f"{report}-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.{extension}"
+
+def xlsx_cell(sheet, value):
+    if not isinstance(value, str):
+        return value
+    value = ILLEGAL_CHARACTERS_RE.sub("", value)
+    if not value.startswith(FORMULA_PREFIXES):
+        return value
+    # openpyxl stores "=..." strings as formulas; pin them as text so the workbook shows them verbatim
+    cell = WriteOnlyCell(sheet, value)
+    cell.data_type = "s"
+    return cell
+
+def append_xlsx_rows(sheet, rows: list):
+    for row in rows:
+        sheet.append([xlsx_cell(sheet, value) for value in row])
+
+def prune_exports():
+    cutoff = time.time() - EXPORT_RETENTION_HOURS * 3600
+    for path in EXPORT_DIR.glob("*.xlsx"):
+        if path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+
+@api_router.get("/exports/{report}")
+async def export_report(
+    report: str,
+    response: Response,
+    file_format: str = Query("csv", alias="format"),
+    filters: dict = Depends(export_filters),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Only admin can export reports")
+    if report not in EXPORT_COLUMNS:
+        raise HTTPException(status_code=404, detail="Unknown report")
+    
+    if file_format == "csv":
+        return StreamingResponse(
+            csv_chunks(await export_cursor(report, filters), EXPORT_COLUMNS[report]),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{export_filename(report, "csv")}"'}
+        )
+    if file_format != "xlsx":
+        raise HTTPException(status_code=400, detail="format must be csv or xlsx")
+    if Workbook is None:
+        raise HTTPException(status_code=501, detail="XLSX export is not available on this server")
+    
+    # Workbooks are built by the job runner; poll the job and download from result.url
+    job = await job_runner.submit("export", {"report": report, "filters": filters}, current_user["id"])
+    response.status_code = 202
+    return job
+
+@job_handler("export")
+async def export_job(ctx: JobContext) -> dict:
+    report, filters = ctx.params["report"], ctx.params["filters"]
+    columns = EXPORT_COLUMNS[report]
+    
+    # write_only workbooks stream rows to a temp file, so memory stays flat however long the range
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(report.title())
+    sheet.append([header for header, _ in columns])
+    rows, batch = 0, []
+    async for doc in await export_cursor(report, filters):
+        batch.append(export_row(doc, columns))
+        if len(batch) >= STREAM_BATCH_SIZE:
+            await asyncio.to_thread(append_xlsx_rows, sheet, batch)
+            rows += len(batch)
+            batch = []
+            await ctx.progress(rows=rows)
+    await asyncio.to_thread(append_xlsx_rows, sheet, batch)
+    rows += len(batch)
+    
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(prune_exports)
+    partial = EXPORT_DIR / f"{ctx.id}.xlsx.part"
+    await asyncio.to_thread(workbook.save, partial)
+    partial.replace(EXPORT_DIR / f"{ctx.id}.xlsx")
+    return {
+        "rows": rows,
+        "filename": export_filename(report, "xlsx"),
+        "url": f"/api/exports/files/{ctx.id}"
+    }
+
+@api_router.get("/exports/files/{job_id}")
+async def download_export(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await find_visible_job(job_id, current_user)
+    path = EXPORT_DIR / f"{job_id}.xlsx"
+    if job["type"] != "export" or job["status"] != "succeeded" or not path.exists():
+        raise HTTPException(status_code=404, detail="Export not found")
+    return FileResponse(path, media_type=XLSX_MEDIA_TYPE, filename=job["result"]["filename"])
+
+# ============== JOB ROUTES ==============
+
+async def find_visible_job(job_id: str, current_user: dict) -> dict:
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0, "active_key": 0})
+    if not job or (current_user["role"] != "ADMIN" and job.get("created_by") != current_user["id"]):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, fields: Optional[list] = Depends(fields_param), current_user: dict = Depends(get_current_user)):
+    return pick_fields(await find_visible_job(job_id, current_user), fields)
+
+@api_router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    await find_visible_job(job_id, current_user)
+    
+    # Queued jobs are cancelled outright; running ones stop at their next progress checkpoint
+    job = await db.jobs.find_one_and_update(
+        {"id": job_id, "status": "queued"},
+        {"$set": {"status": "cancelled", "finished_at": datetime.now(timezone.utc).isoformat()},
+         "$unset": {"active_key": ""}},
+        projection={"_id": 0, "active_key": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if job is None:
+        job = await db.jobs.find_one_and_update(
+            {"id": job_id, "status": "running"},
+            {"$set": {"cancel_requested": True}},
+            projection={"_id": 0, "active_key": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    if job is None:
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return job
 
 # ============== SETTINGS ROUTES ==============
 
 @api_router.get("/settings")
-async def get_settings(current_user: dict = Depends(get_current_user)):
-    settings = await db.settings.find_one({"id": "settings"}, {"_id": 0})
-    return settings or {}
+async def get_settings(
+    request: Request,
+    response: Response,
+    fields: Optional[list] = Depends(fields_param),
+    current_user: dict = Depends(get_current_user)
+):
+    # The settings document carries its own version counter, kept current by settings_cache
+    settings = await single_flight.do("get_settings", "all", (), settings_cache.get)
+    etag = make_etag(request, current_user, "settings", settings_cache.version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    with_etag(response, etag)
+    return pick_fields(settings, fields)
 
 @api_router.put("/settings")
 async def update_settings(update: dict, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "ADMIN":
         raise HTTPException(status_code=403, detail="Only admin can update settings")
     
-    update_data = {k: v for k, v in update.items() if v is not None}
-    await db.settings.update_one({"id": "settings"}, {"$set": update_data}, upsert=True)
-    
-    settings = await db.settings.find_one({"id": "settings"}, {"_id": 0})
+    update_data = {k: v for k, v in update.items() if v is not None and k not in ("_id", "id", "version")}
+    settings = await db.settings.find_one_and_update(
+        {"id": "settings"},
+        {"$set": update_data, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    settings_cache.set(settings)
     return settings
 
 # ============== LEAD ROUTES ==============
 
 @api_router.get("/leads")
-async def get_leads(current_user: dict = Depends(get_current_user)):
-    leads = await db.employees.find({"role": "LEAD"}, {"_id": 0, "password": 0}).to_list(100)
-    return leads
+async def get_leads(
+    request: Request,
+    response: Response,
+    fields: Optional[list] = Depends(fields_param),
+    current_user: dict = Depends(get_current_user)
+):
+    etag = make_etag(request, current_user, "leads", await collection_versions.get("employees"))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    with_etag(response, etag)
+    
+    def load_leads():
+        return db.employees.find({"role": "LEAD"}, field_projection(fields, {"_id": 0, "password": 0})).to_list(100)
+    
+    return await single_flight.do("get_leads", "all", tuple(fields or ()), load_leads)
 
 @api_router.get("/lead-permissions/{lead_id}")
-async def get_lead_permissions(lead_id: str, current_user: dict = Depends(get_current_user)):
+async def get_lead_permissions(lead_id: str, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    etag = make_etag(request, current_user, "lead_permissions", lead_id, await collection_versions.get("lead_permissions"))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    with_etag(response, etag)
+    
     permissions = await db.lead_permissions.find_one({"lead_id": lead_id}, {"_id": 0})
     return permissions or {"lead_id": lead_id, "modules": []}
 
@@ -792,53 +3387,144 @@ async def update_lead_permissions(lead_id: str, update: dict, current_user: dict
         {"$set": {"lead_id": lead_id, "modules": update.get("modules", [])}},
         upsert=True
     )
+    await collection_versions.bump("lead_permissions")
     
     permissions = await db.lead_permissions.find_one({"lead_id": lead_id}, {"_id": 0})
     return permissions
 
 # ============== DASHBOARD STATS ==============
 
+async def compute_dashboard_stats(today: str) -> dict:
+    employees_pipeline = [
+        {"$match": {"role": "EMPLOYEE"}},
+        {"$group": {"_id": None, "count": {"$sum": 1}, "salary": {"$sum": {"$ifNull": ["$salary", 0]}}}}
+    ]
+    leaves_pipeline = [
+        {"$match": {"status": {"$in": ["Pending", "Approved"]}}},
+        {"$facet": {
+            "pending": [{"$match": {"status": "Pending"}}, {"$count": "n"}],
+            "on_leave": [
+                {"$match": {"status": "Approved", "start_date": {"$lte": today}, "end_date": {"$gte": today}}},
+                {"$count": "n"}
+            ]
+        }}
+    ]
+    fines_pipeline = [
+        {"$match": {"status": "Unpaid"}},
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+    ]
+    
+    employees, present_today, leaves, fines = await asyncio.gather(
+        reporting_db.employees.aggregate(employees_pipeline).to_list(1),
+        reporting_db.attendance.count_documents({"date": today, "status": {"$in": ["Present", "Late"]}}),
+        reporting_db.leaves.aggregate(leaves_pipeline).to_list(1),
+        reporting_db.fines.aggregate(fines_pipeline).to_list(1)
+    )
+    
+    total_employees = employees[0]["count"] if employees else 0
+    leaves = leaves[0] if leaves else {}
+    return {
+        "total_employees": total_employees,
+        "present_today": present_today,
+        "absent_today": total_employees - present_today,
+        "pending_leaves": leaves["pending"][0]["n"] if leaves.get("pending") else 0,
+        "on_leave": leaves["on_leave"][0]["n"] if leaves.get("on_leave") else 0,
+        "total_fines": fines[0]["total"] if fines else 0,
+        "monthly_payroll": employees[0]["salary"] if employees else 0
+    }
+
 @api_router.get("/dashboard/stats")
 async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     
-    # Total employees
-    total_employees = await db.employees.count_documents({"role": "EMPLOYEE"})
-    
-    # Present today
-    present_today = await db.attendance.count_documents({"date": today, "status": {"$in": ["Present", "Late"]}})
-    
-    # Absent today
-    absent_today = total_employees - present_today
-    
-    # Pending leaves
-    pending_leaves = await db.leaves.count_documents({"status": "Pending"})
-    
-    # On leave today
-    on_leave = await db.leaves.count_documents({
-        "status": "Approved",
-        "start_date": {"$lte": today},
-        "end_date": {"$gte": today}
-    })
-    
-    # Total fines
-    fines_cursor = await db.fines.find({"status": "Unpaid"}, {"_id": 0}).to_list(1000)
-    total_fines = sum(f["amount"] for f in fines_cursor)
+    stats = dashboard_cache.get(today)
+    if stats is None:
+        # On expiry the first caller recomputes and everyone arriving meanwhile waits for that result
+        stats = await single_flight.do("get_dashboard_stats", "all", (today,), lambda: compute_dashboard_stats(today))
+        dashboard_cache.set(today, stats)
+    return stats
+
+# ============== SYSTEM ROUTES ==============
+
+@api_router.get("/system/cache-stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Only admin can view cache stats")
     
-    # Monthly payroll
-    employees = await db.employees.find({"role": "EMPLOYEE"}, {"_id": 0}).to_list(1000)
-    monthly_payroll = sum(e.get("salary", 0) for e in employees)
+    return {
+        "principal": principal_cache.stats(),
+        "dashboard": dashboard_cache.stats(),
+        "settings": settings_cache.stats(),
+        "versions": collection_versions.stats(),
+        "single_flight": single_flight.stats()
+    }
+
+@api_router.get("/metrics")
+async def get_metrics(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Scrapers send METRICS_TOKEN; anyone else needs an admin session unless METRICS_PUBLIC is set
+    if not METRICS_PUBLIC:
+        if not credentials:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        if not (METRICS_TOKEN and hmac.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode())):
+            user = await authenticate(credentials.credentials)
+            if user["role"] != "ADMIN":
+                raise HTTPException(status_code=403, detail="Only admin can view metrics")
+    
+    caches = {"principal": principal_cache, "dashboard": dashboard_cache}
+    extra = [
+        ("hrms_cache_hits_total", "counter", "Cache hits by cache",
+         [({"cache": name}, cache.hits) for name, cache in caches.items()]),
+        ("hrms_cache_misses_total", "counter", "Cache misses by cache",
+         [({"cache": name}, cache.misses) for name, cache in caches.items()]),
+        ("hrms_attendance_stream_subscribers", "gauge", "Open attendance SSE connections in this worker",
+         [({}, len(attendance_feed.subscribers))]),
+        ("hrms_attendance_stream_dropped_total", "counter", "Attendance SSE clients dropped for falling behind",
+         [({}, attendance_feed.dropped)]),
+        ("hrms_singleflight_in_flight", "gauge", "Coalesced reads currently running",
+         [({}, len(single_flight.calls))]),
+        ("hrms_password_hash_queue_depth", "gauge", "Password hash/verify calls waiting for a thread",
+         [({}, password_hasher.waiting)]),
+        ("hrms_password_hash_active", "gauge", "Password hash/verify calls running",
+         [({}, password_hasher.active)]),
+        ("hrms_password_hash_rejected_total", "counter", "Password hash/verify calls rejected with 503",
+         [({}, password_hasher.rejected)]),
+        ("hrms_password_rehash_total", "counter", "Legacy password hashes upgraded at login",
+         [({}, password_hasher.rehashed)]),
+    ]
+    return Response(content=metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+@api_router.get("/system/index-report")
+async def get_index_report(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Only admin can view the index report")
     
+    report = await index_coverage_report()
     return {
-        "total_employees": total_employees,
-        "present_today": present_today,
-        "absent_today": absent_today,
-        "pending_leaves": pending_leaves,
-        "on_leave": on_leave,
-        "total_fines": total_fines,
-        "monthly_payroll": monthly_payroll
+        "uncovered": [r for r in report if not r["covered"]],
+        "queries": report
     }
 
+@api_router.post("/system/migrate-profile-pics")
+async def migrate_profile_pics(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "ADMIN":
+        raise HTTPException(status_code=403, detail="Only admin can migrate profile pictures")
+    
+    migrated = 0
+    failed = []
+    cursor = db.employees.find({"profile_pic": {"$regex": "^data:"}}, {"_id": 0, "id": 1, "profile_pic": 1})
+    async for emp in cursor:
+        try:
+            url = await resolve_profile_pic(emp["profile_pic"])
+        except HTTPException as e:
+            failed.append({"id": emp["id"], "error": e.detail})
+            continue
+        await db.employees.update_one({"id": emp["id"]}, {"$set": {"profile_pic": url}})
+        principal_cache.invalidate(emp["id"])
+        migrated += 1
+    if migrated:
+        await collection_versions.bump("employees")
+    return {"migrated": migrated, "failed": failed}
+
 # ============== ROOT ROUTE ==============
 
 @api_router.get("/")
@@ -855,8 +3541,159 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Content-Disposition"],
 )
 
+# Response compression
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()[2:] if params.strip().startswith("q=") else "1"
+        try:
+            accepted[coding.strip()] = float(q)
+        except ValueError:
+            continue
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+class StreamCompressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # Streamed bodies are flushed per chunk so NDJSON rows still reach the client promptly
+        if self.encoding == "br":
+            out = self.compressor.process(data)
+            return out + (self.compressor.finish() if final else self.compressor.flush())
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = None
+        if scope["type"] == "http":
+            encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start = None
+        compressor = None
+        passthrough = False
+        
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if ("content-encoding" in headers or content_type not in COMPRESSIBLE_TYPES
+                        or (not more_body and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = StreamCompressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+                if not more_body:
+                    body = compressor.compress(body, final=True)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, final=not more_body),
+                "more_body": more_body
+            })
+        
+        await self.app(scope, receive, send_wrapper)
+
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
+# Request metrics
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        if stack_sampler is not None:
+            stack_sampler.start(threading.get_ident())
+        stats = {"db_ops": 0, "db_seconds": 0.0}
+        token = request_stats.set(stats)
+        status_code = 500
+        size = 0
+        started = time.monotonic()
+        
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_stats.reset(token)
+            finished = time.monotonic()
+            route = scope.get("route")
+            labels = {"method": scope["method"], "route": route.path if route else "unmatched"}
+            metrics.observe("hrms_http_request_duration_seconds", {**labels, "status": str(status_code)}, finished - started)
+            metrics.observe("hrms_http_response_size_bytes", labels, size)
+            metrics.observe("hrms_http_request_db_ops", labels, stats["db_ops"])
+            metrics.observe("hrms_http_request_db_seconds", labels, stats["db_seconds"])
+            if stack_sampler is not None and (finished - started) * 1000 >= SLOW_REQUEST_PROFILE_MS:
+                dump_slow_request(labels, started, finished, stats)
+
+def dump_slow_request(labels: dict, started: float, finished: float, stats: dict):
+    elapsed_ms = round((finished - started) * 1000, 1)
+    stacks = stack_sampler.collapse(started, finished)
+    logger.warning(
+        f"Slow request {labels['method']} {labels['route']}: {elapsed_ms} ms, "
+        f"{stats['db_ops']} db ops, {sum(stacks.values())} samples"
+    )
+    if PROFILE_DIR:
+        # Collapsed-stack format, loadable by flamegraph.pl / speedscope
+        path = Path(PROFILE_DIR) / f"slow-{int(time.time() * 1000)}-{labels['route'].strip('/').replace('/', '_')}.folded"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in stacks.items()))
+    else:
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1])[:5]:
+            logger.warning(f"  {count} samples: {stack}")
+
+app.add_middleware(MetricsMiddleware)
+
 # Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -866,9 +3703,19 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
+    await ensure_indexes()
     await init_default_data()
+    await backfill_leave_ledger()
+    app.state.settings_watcher = asyncio.create_task(settings_cache.watch())
+    app.state.job_runner = asyncio.create_task(job_runner.run())
+    app.state.attendance_watcher = asyncio.create_task(attendance_feed.watch())
+    app.state.version_watcher = asyncio.create_task(collection_versions.watch())
     logger.info("CRM A.R HR System API started")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.settings_watcher.cancel()
+    app.state.job_runner.cancel()
+    app.state.attendance_watcher.cancel()
+    app.state.version_watcher.cancel()
     client.close()
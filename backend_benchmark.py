@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+SCENARIOS = ["checkin_storm", "login_rush", "dashboard_polling", "payroll_month_end", "serialization"]
+DEPARTMENTS = ["Design", "Development", "Marketing", "Sales", "Support", "Finance"]
+
+class HRMSBenchmark:
+    def __init__(self, args):
+        self.args = args
+        self.server = None
+        self.http = None
+        self.admin_token = None
+        self.employees = []
+        self.results = {}
+        self.payloads = {}
+
+    async def setup(self):
+        """Import the API against the chosen database and seed a synthetic org"""
+        os.environ["MONGO_URL"] = self.args.mongo_url if self.args.mongo_url != "mock" else "mongodb://localhost:27017"
+        os.environ["DB_NAME"] = self.args.db_name
+        sys.path.insert(0, str(ROOT_DIR / "backend"))
+        import server
+        import httpx
+
+        if self.args.mongo_url == "mock":
+            try:
+                from mongomock_motor import AsyncMongoMockClient
+            except ImportError:
+                raise SystemExit("mongomock-motor is required for --mongo-url mock (pip install mongomock-motor)")
+            server.client = AsyncMongoMockClient()
+            server.db = server.client[self.args.db_name]
+            server.reporting_db = server.db
+        else:
+            await server.client.drop_database(self.args.db_name)
+
+        self.server = server
+        await server.ensure_indexes()
+        await self.seed()
+        self.http = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=server.app),
+            base_url="http://benchmark",
+            timeout=self.args.timeout
+        )
+
+    async def seed(self):
+        """Seed employees, attendance history, fines and leaves"""
+        server = self.server
+        db = server.db
+        rng = random.Random(self.args.seed)
+        now = datetime.now(timezone.utc)
+        started = time.perf_counter()
+
+        admin = {
+            "id": str(uuid.uuid4()), "name": "Benchmark Admin", "username": "bench_admin",
+            "password": await server.password_hasher.hash("bench"), "designation": "Admin", "salary": 0,
+            "role": "ADMIN", "status": "active", "employee_id": "ADMIN-BENCH",
+            "created_at": now.isoformat()
+        }
+        await db.employees.insert_one(admin)
+        self.admin_token = server.create_token(admin["id"], "ADMIN")
+
+        password = await server.password_hasher.hash("12345678")
+        for i in range(self.args.employees):
+            self.employees.append({
+                "id": str(uuid.uuid4()), "name": f"Employee {i}", "username": f"emp{i}",
+                "password": password, "email": f"emp{i}@bench.local",
+                "department": rng.choice(DEPARTMENTS), "designation": "Staff",
+                "salary": rng.randrange(30000, 150000, 1000), "role": "EMPLOYEE",
+                "status": "active", "joining_date": "2024-01-01", "profile_pic": None,
+                "employee_id": f"EMP-{i:05d}", "lead_id": None,
+                "allowed_modules": ["dashboard", "attendance", "leave", "fines", "salary"],
+                "created_at": now.isoformat()
+            })
+        await insert_batched(db.employees, self.employees)
+        await db.settings.insert_one({
+            "id": "settings", "office_start_time": "09:00", "office_end_time": "18:00",
+            "late_fine_amount": 100, "half_day_hours": 4,
+            "leave_policy": {"annual": 12, "sick": 10, "bereavement": 5, "wedding": 7},
+            "salary_settings": {}
+        })
+
+        # Attendance for every working day of the last M months, excluding today
+        attendance = []
+        day = now - timedelta(days=30 * self.args.months)
+        while day.date() < now.date():
+            if day.weekday() < 5:
+                date = day.strftime("%Y-%m-%d")
+                for emp in self.employees:
+                    late = rng.random() < 0.15
+                    check_in = f"09:{rng.randint(5, 40):02d}" if late else f"08:{rng.randint(30, 59):02d}"
+                    attendance.append({
+                        "id": str(uuid.uuid4()), "employee_id": emp["id"], "date": date,
+                        "check_in": check_in, "check_out": f"18:{rng.randint(0, 30):02d}",
+                        "status": "Late" if late else "Present", "method": "Manual",
+                        "location": {"lat": 31.5 + rng.random() / 100, "lng": 74.3 + rng.random() / 100},
+                        "working_hours": round(9 + rng.random(), 2), "is_late": late, "is_early_out": False
+                    })
+                    if len(attendance) >= 5000:
+                        await insert_batched(db.attendance, attendance)
+                        attendance = []
+            day += timedelta(days=1)
+        await insert_batched(db.attendance, attendance)
+
+        fines = []
+        leaves = []
+        for emp in self.employees:
+            for _ in range(rng.randint(0, 3)):
+                fines.append({
+                    "id": str(uuid.uuid4()), "employee_id": emp["id"], "amount": rng.choice([100, 200, 500]),
+                    "reason": "Late arrival", "date": now.strftime("%Y-%m-%d"), "status": "Unpaid"
+                })
+            if rng.random() < 0.3:
+                start = now - timedelta(days=rng.randint(0, 30 * self.args.months))
+                leaves.append({
+                    "id": str(uuid.uuid4()), "employee_id": emp["id"], "employee_name": emp["name"],
+                    "type": rng.choice(["annual", "sick"]), "start_date": start.strftime("%Y-%m-%d"),
+                    "end_date": (start + timedelta(days=rng.randint(0, 3))).strftime("%Y-%m-%d"),
+                    "reason": "Benchmark", "status": rng.choice(["Pending", "Approved"]),
+                    "request_date": start.strftime("%Y-%m-%d")
+                })
+        await insert_batched(db.fines, fines)
+        await insert_batched(db.leaves, leaves)
+
+        counts = {name: await db[name].count_documents({}) for name in ["employees", "attendance", "fines", "leaves"]}
+        print(f"🌱 Seeded {counts} in {time.perf_counter() - started:.1f}s")
+
+    def db_ops_snapshot(self):
+        """Total Mongo commands and requests recorded by the metrics middleware"""
+        ops = 0.0
+        requests = 0
+        metrics = self.server.metrics
+        with metrics.lock:
+            for (name, _), histogram in metrics.histograms.items():
+                if name == "hrms_http_request_db_ops":
+                    ops += histogram.sum
+                    requests += histogram.count
+        return ops, requests
+
+    async def run_requests(self, name, calls):
+        """Run (method, path, token, body) calls with bounded concurrency and record latencies"""
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(method, path, token, body):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await self.http.request(
+                    method, f"/api/{path}", json=body,
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+
+        ops_before, requests_before = self.db_ops_snapshot()
+        started = time.perf_counter()
+        await asyncio.gather(*(one(*call) for call in calls))
+        elapsed = time.perf_counter() - started
+        ops_after, requests_after = self.db_ops_snapshot()
+
+        requests = requests_after - requests_before
+        result = {
+            "requests": len(calls),
+            "errors": errors,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "throughput_rps": round(len(calls) / elapsed, 1),
+            "db_ops_per_request": round((ops_after - ops_before) / requests, 2) if requests and self.args.mongo_url != "mock" else None
+        }
+        self.results[name] = result
+        return result
+
+    async def checkin_storm(self):
+        """Every employee checks in at the same moment"""
+        calls = []
+        for emp in self.employees:
+            token = self.server.create_token(emp["id"], "EMPLOYEE")
+            calls.append(("POST", "attendance/check-in", token, {"method": "Biometric"}))
+        return await self.run_requests("checkin_storm", calls)
+
+    async def login_rush(self):
+        """Employees signing in together at shift start; bcrypt runs in the hashing pool"""
+        calls = []
+        for emp in self.employees[:self.args.polls]:
+            calls.append(("POST", "auth/login", None, {"username": emp["username"], "password": "12345678"}))
+        return await self.run_requests("login_rush", calls)
+
+    async def dashboard_polling(self):
+        """Admins polling the dashboard and attendance board"""
+        calls = []
+        for _ in range(self.args.polls):
+            calls.append(("GET", "dashboard/stats", self.admin_token, None))
+        return await self.run_requests("dashboard_polling", calls)
+
+    async def payroll_month_end(self):
+        """Month-end payroll run for the whole company"""
+        now = datetime.now(timezone.utc)
+        calls = [("POST", "payroll/process", self.admin_token, {"month": now.strftime("%m"), "year": now.strftime("%Y")})]
+        return await self.run_requests("payroll_month_end", calls)
+
+    async def serialization(self):
+        """Encode time and compressed size of the employee and attendance listings"""
+        limit = self.server.MAX_PAGE_SIZE
+        headers = {"Authorization": f"Bearer {self.admin_token}", "Accept-Encoding": "identity"}
+        for name, path in (("get_employees", "employees"), ("get_attendance", "attendance")):
+            response = await self.http.get(f"/api/{path}", params={"limit": limit}, headers=headers)
+            self.payloads[name] = measure_payload(response.json())
+        
+        # The same listings over HTTP with the client's default Accept-Encoding
+        calls = []
+        for _ in range(max(1, self.args.polls // 10)):
+            calls.append(("GET", f"employees?limit={limit}", self.admin_token, None))
+            calls.append(("GET", f"attendance?limit={limit}", self.admin_token, None))
+        return await self.run_requests("serialization", calls)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def best_of(fn, rounds=5):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, round(min(timings), 2)
+
+def measure_payload(docs):
+    """Compare the old jsonable_encoder + json path with orjson, and gzip/brotli against raw bytes"""
+    import gzip
+    import orjson
+    from fastapi.encoders import jsonable_encoder
+
+    stdlib_body, stdlib_ms = best_of(lambda: json.dumps(jsonable_encoder(docs)).encode())
+    body, orjson_ms = best_of(lambda: orjson.dumps(docs))
+    report = {
+        "rows": len(docs),
+        "stdlib_encode_ms": stdlib_ms,
+        "orjson_encode_ms": orjson_ms,
+        "raw_bytes": len(body),
+    }
+    gzipped, report["gzip_ms"] = best_of(lambda: gzip.compress(body, compresslevel=6))
+    report["gzip_bytes"] = len(gzipped)
+    try:
+        import brotli
+    except ImportError:
+        return report
+    compressed, report["brotli_ms"] = best_of(lambda: brotli.compress(body, quality=4))
+    report["brotli_bytes"] = len(compressed)
+    return report
+
+async def insert_batched(collection, docs, batch_size=5000):
+    for i in range(0, len(docs), batch_size):
+        await collection.insert_many([dict(doc) for doc in docs[i:i + batch_size]], ordered=False)
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Flag scenarios whose p99 or throughput regressed beyond the tolerance"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if previous["p99_ms"] and result["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous['p99_ms']} -> {result['p99_ms']} ms")
+        if previous["throughput_rps"] and result["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {result['throughput_rps']} req/s")
+        if previous.get("db_ops_per_request") and result.get("db_ops_per_request") and \
+                result["db_ops_per_request"] > previous["db_ops_per_request"] * (1 + tolerance):
+            regressions.append(f"{name}: db ops/request {previous['db_ops_per_request']} -> {result['db_ops_per_request']}")
+    return regressions
+
+async def run(args):
+    bench = HRMSBenchmark(args)
+    await bench.setup()
+
+    print("\n" + "=" * 60)
+    print(f"{'scenario':<20}{'reqs':>6}{'err':>5}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>9}{'db ops':>8}")
+    print("-" * 60)
+    for name in args.scenarios:
+        result = await getattr(bench, name)()
+        db_ops = "n/a" if result["db_ops_per_request"] is None else result["db_ops_per_request"]
+        print(f"{name:<20}{result['requests']:>6}{result['errors']:>5}{result['p50_ms']:>9}"
+              f"{result['p99_ms']:>9}{result['throughput_rps']:>9}{db_ops:>8}")
+    await bench.http.aclose()
+
+    if bench.payloads:
+        print("\n" + "=" * 60)
+        print(f"{'payload':<16}{'rows':>7}{'json ms':>9}{'orjson ms':>11}{'raw KB':>9}{'gzip KB':>9}{'br KB':>8}")
+        print("-" * 60)
+        for name, payload in bench.payloads.items():
+            brotli_kb = round(payload["brotli_bytes"] / 1024, 1) if "brotli_bytes" in payload else "n/a"
+            print(f"{name:<16}{payload['rows']:>7}{payload['stdlib_encode_ms']:>9}{payload['orjson_encode_ms']:>11}"
+                  f"{payload['raw_bytes'] / 1024:>9.1f}{payload['gzip_bytes'] / 1024:>9.1f}{brotli_kb:>8}")
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline")},
+        "results": bench.results,
+        "payloads": bench.payloads
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(bench.results, indent=2))
+        print(f"\n💾 Baseline saved to {baseline_path}")
+        return 0
+    if baseline_path.exists():
+        regressions = compare_with_baseline(bench.results, json.loads(baseline_path.read_text()), args.tolerance)
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\n✅ Within {args.tolerance:.0%} of baseline")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the HR API against a local Mongo or mongomock-motor")
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCH_MONGO_URL", "mock"),
+                        help='Mongo URL of a disposable local mongod, or "mock" for mongomock-motor')
+    parser.add_argument("--db-name", default="hrms_benchmark")
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--months", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--polls", type=int, default=200, help="dashboard requests in dashboard_polling, sign-ins in login_rush")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--baseline", default=str(ROOT_DIR / "bench_baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", help="write the full JSON report here")
+    args = parser.parse_args()
+
+    print("🚀 Starting CRM HR System API benchmark...")
+    return asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -33,6 +33,22 @@ api.interceptors.response.use(
   }
 );
 
+// Delay before reopening a dropped event stream
+const STREAM_RETRY_MS = 3000;
+
+// List endpoints return one page at a time and put the next page's cursor in X-Next-Cursor;
+// follows it so callers always get the complete list
+const getAllPages = async (url, params = {}) => {
+  const rows = [];
+  let after;
+  do {
+    const response = await api.get(url, { params: after ? { ...params, after } : params });
+    rows.push(...response.data);
+    after = response.headers['x-next-cursor'];
+  } while (after);
+  return rows;
+};
+
 // Auth API
 export const authAPI = {
   login: async (username, password) => {
@@ -51,10 +67,7 @@ export const authAPI = {
 
 // Employee API
 export const employeeAPI = {
-  getAll: async () => {
-    const response = await api.get('/employees');
-    return response.data;
-  },
+  getAll: async (params = {}) => getAllPages('/employees', params),
   getById: async (id) => {
     const response = await api.get(`/employees/${id}`);
     return response.data;
@@ -71,14 +84,20 @@ export const employeeAPI = {
     const response = await api.delete(`/employees/${id}`);
     return response.data;
   },
+  // file: a CSV or NDJSON File/Blob; mode is 'create' or 'upsert'
+  import: async (file, { mode = 'create', dryRun = false } = {}) => {
+    const contentType = file.name?.endsWith('.csv') ? 'text/csv' : 'application/x-ndjson';
+    const response = await api.post('/employees/import', file, {
+      params: { mode, dry_run: dryRun },
+      headers: { 'Content-Type': contentType },
+    });
+    return response.data;
+  },
 };
 
 // Attendance API
 export const attendanceAPI = {
-  getAll: async (params = {}) => {
-    const response = await api.get('/attendance', { params });
-    return response.data;
-  },
+  getAll: async (params = {}) => getAllPages('/attendance', params),
   create: async (attendance) => {
     const response = await api.post('/attendance', attendance);
     return response.data;
@@ -95,14 +114,56 @@ export const attendanceAPI = {
     const response = await api.post('/attendance/check-out', data);
     return response.data;
   },
+  getBoard: async (params = {}) => {
+    const response = await api.get('/attendance/board', { params });
+    return response.data;
+  },
+  // Live check-in/check-out deltas over Server-Sent Events; returns a function that closes the stream.
+  // Events sent while disconnected are not replayed, so onReconnect runs after every reconnect to reload
+  subscribe: (onEvent, onReconnect) => {
+    let source;
+    let retryTimer;
+    let closed = false;
+    let connected = false;
+    const retry = () => {
+      if (!closed) retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+    };
+    const connect = async () => {
+      let ticket;
+      try {
+        // EventSource cannot send headers; a short-lived ticket keeps the login token out of URLs and logs
+        ({ ticket } = (await api.post('/attendance/stream/ticket')).data);
+      } catch (error) {
+        retry();
+        return;
+      }
+      if (closed) return;
+      source = new EventSource(`${API_URL}/attendance/stream?ticket=${encodeURIComponent(ticket)}`);
+      source.addEventListener('open', () => {
+        if (connected && onReconnect) onReconnect();
+        connected = true;
+      });
+      ['check_in', 'check_out', 'update'].forEach((type) => {
+        source.addEventListener(type, (e) => onEvent(JSON.parse(e.data)));
+      });
+      // The browser would retry with the same ticket, which expires; reconnect with a fresh one instead
+      source.addEventListener('error', () => {
+        source.close();
+        retry();
+      });
+    };
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  },
 };
 
 // Leave API
 export const leaveAPI = {
-  getAll: async (params = {}) => {
-    const response = await api.get('/leaves', { params });
-    return response.data;
-  },
+  getAll: async (params = {}) => getAllPages('/leaves', params),
   create: async (leave) => {
     const response = await api.post('/leaves', leave);
     return response.data;
@@ -115,14 +176,20 @@ export const leaveAPI = {
     const response = await api.delete(`/leaves/${id}`);
     return response.data;
   },
+  // Per-type entitlement/used/pending/remaining days; params: employee_id, year
+  getBalances: async (params = {}) => {
+    const response = await api.get('/leaves/balances', { params });
+    return response.data;
+  },
+  rebuildBalances: async () => {
+    const response = await api.post('/leaves/balances/rebuild');
+    return response.data;
+  },
 };
 
 // Fine API
 export const fineAPI = {
-  getAll: async (params = {}) => {
-    const response = await api.get('/fines', { params });
-    return response.data;
-  },
+  getAll: async (params = {}) => getAllPages('/fines', params),
   create: async (fine) => {
     const response = await api.post('/fines', fine);
     return response.data;
@@ -139,10 +206,7 @@ export const fineAPI = {
 
 // Appeal API
 export const appealAPI = {
-  getAll: async (params = {}) => {
-    const response = await api.get('/appeals', { params });
-    return response.data;
-  },
+  getAll: async (params = {}) => getAllPages('/appeals', params),
   create: async (appeal) => {
     const response = await api.post('/appeals', appeal);
     return response.data;
@@ -155,10 +219,7 @@ export const appealAPI = {
 
 // Payroll API
 export const payrollAPI = {
-  getAll: async (params = {}) => {
-    const response = await api.get('/payroll', { params });
-    return response.data;
-  },
+  getAll: async (params = {}) => getAllPages('/payroll', params),
   process: async (data = {}) => {
     const response = await api.post('/payroll/process', data);
     return response.data;
@@ -171,6 +232,10 @@ export const payrollAPI = {
     const response = await api.post(`/payroll/pay/${employeeId}`, {});
     return response.data;
   },
+  getSheet: async (params = {}) => {
+    const response = await api.get('/payroll/sheet', { params });
+    return response.data;
+  },
 };
 
 // Settings API
@@ -201,6 +266,69 @@ export const leadAPI = {
   },
 };
 
+// Media API
+export const mediaAPI = {
+  upload: async (file) => {
+    const form = new FormData();
+    form.append('file', file);
+    const response = await api.post('/media', form, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    });
+    return response.data;
+  },
+};
+
+// Stored media references are API paths; resolve them against the backend URL
+export const mediaUrl = (path) => (path && path.startsWith('/api/') ? `${BACKEND_URL}${path}` : path);
+
+// Jobs API
+export const jobAPI = {
+  get: async (id) => {
+    const response = await api.get(`/jobs/${id}`);
+    return response.data;
+  },
+  cancel: async (id) => {
+    const response = await api.post(`/jobs/${id}/cancel`);
+    return response.data;
+  },
+  // Polls until the job leaves queued/running; onProgress sees every snapshot
+  wait: async (id, onProgress, interval = 1000) => {
+    for (;;) {
+      const job = await jobAPI.get(id);
+      if (onProgress) onProgress(job);
+      if (job.status !== 'queued' && job.status !== 'running') return job;
+      await new Promise((resolve) => setTimeout(resolve, interval));
+    }
+  },
+};
+
+// Saves a blob response under the filename from Content-Disposition
+const saveDownload = (response, fallbackName) => {
+  const match = /filename="([^"]+)"/.exec(response.headers['content-disposition'] || '');
+  const url = URL.createObjectURL(response.data);
+  const link = document.createElement('a');
+  link.href = url;
+  link.download = match ? match[1] : fallbackName;
+  link.click();
+  URL.revokeObjectURL(url);
+};
+
+// Export API (reports: attendance, fines, payroll)
+export const exportAPI = {
+  downloadCsv: async (report, params = {}) => {
+    const response = await api.get(`/exports/${report}`, { params, responseType: 'blob' });
+    saveDownload(response, `${report}.csv`);
+  },
+  // XLSX workbooks are built by a background job; waits for it, then downloads the file
+  downloadXlsx: async (report, params = {}, onProgress) => {
+    const submitted = await api.get(`/exports/${report}`, { params: { ...params, format: 'xlsx' } });
+    const job = await jobAPI.wait(submitted.data.id, onProgress);
+    if (job.status !== 'succeeded') throw new Error(job.error || `Export ${job.status}`);
+    const response = await api.get(`/exports/files/${job.id}`, { responseType: 'blob' });
+    saveDownload(response, job.result.filename);
+  },
+};
+
 // Dashboard API
 export const dashboardAPI = {
   getStats: async () => {
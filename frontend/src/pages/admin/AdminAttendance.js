@@ -1,10 +1,9 @@
 import React, { useState, useEffect } from 'react';
-import { attendanceAPI, employeeAPI } from '../../lib/api';
+import { attendanceAPI } from '../../lib/api';
 import { MapPin, Calendar, Filter } from 'lucide-react';
 
 const AdminAttendance = () => {
   const [employees, setEmployees] = useState([]);
-  const [attendance, setAttendance] = useState([]);
   const [loading, setLoading] = useState(true);
   const [filterDate, setFilterDate] = useState(new Date().toISOString().split('T')[0]);
   const [filterDepartment, setFilterDepartment] = useState('');
@@ -13,14 +12,21 @@ const AdminAttendance = () => {
     loadData();
   }, [filterDate]);
 
+  // Today's board is kept current by the live feed instead of re-fetching
+  useEffect(() => {
+    if (filterDate !== new Date().toISOString().split('T')[0]) return undefined;
+    return attendanceAPI.subscribe((event) => {
+      if (event.date !== filterDate) return;
+      setEmployees((current) =>
+        current.map((emp) => (emp.id === event.employee_id ? { ...emp, attendance: event.attendance } : emp))
+      );
+    }, loadData);
+  }, [filterDate]);
+
   const loadData = async () => {
     try {
-      const [empData, attData] = await Promise.all([
-        employeeAPI.getAll(),
-        attendanceAPI.getAll({ date: filterDate }),
-      ]);
-      setEmployees(empData.filter((e) => e.role === 'EMPLOYEE'));
-      setAttendance(attData);
+      const board = await attendanceAPI.getBoard({ date: filterDate });
+      setEmployees(board);
     } catch (error) {
       console.error('Failed to load data:', error);
     } finally {
@@ -28,10 +34,6 @@ const AdminAttendance = () => {
     }
   };
 
-  const getRecordForEmployee = (empId) => {
-    return attendance.find((a) => a.employee_id === empId);
-  };
-
   const departments = [...new Set(employees.map((e) => e.department).filter(Boolean))];
   const filteredEmployees = filterDepartment
     ? employees.filter((e) => e.department === filterDepartment)
@@ -96,7 +98,7 @@ const AdminAttendance = () => {
             </thead>
             <tbody className="divide-y divide-border">
               {filteredEmployees.map((emp) => {
-                const record = getRecordForEmployee(emp.id);
+                const record = emp.attendance;
                 return (
                   <tr key={emp.id} className="hover:bg-secondary/50 transition-colors" data-testid={`attendance-row-${emp.id}`}>
                     <td className="px-8 py-6">
@@ -22,12 +22,8 @@ const AdminFines = () => {
 
   const loadData = async () => {
     try {
-      const [finesData, empData] = await Promise.all([
-        fineAPI.getAll(),
-        employeeAPI.getAll(),
-      ]);
+      const finesData = await fineAPI.getAll({ expand: 'employee' });
       setFines(finesData);
-      setEmployees(empData.filter((e) => e.role === 'EMPLOYEE'));
     } catch (error) {
       toast.error('Failed to load data');
     } finally {
@@ -35,6 +31,17 @@ const AdminFines = () => {
     }
   };
 
+  // The roster is only needed for the employee picker in the form
+  const loadEmployees = async () => {
+    if (employees.length) return;
+    try {
+      const empData = await employeeAPI.getAll();
+      setEmployees(empData.filter((e) => e.role === 'EMPLOYEE'));
+    } catch (error) {
+      toast.error('Failed to load employees');
+    }
+  };
+
   const handleSave = async (e) => {
     e.preventDefault();
     try {
@@ -83,13 +90,11 @@ const AdminFines = () => {
       reason: fine.reason,
       date: fine.date,
     });
+    loadEmployees();
     setModalOpen(true);
   };
 
-  const getEmployeeName = (empId) => {
-    const emp = employees.find((e) => e.id === empId);
-    return emp?.name || 'Unknown';
-  };
+  const getEmployeeName = (fine) => fine.employee?.name || 'Unknown';
 
   const totalFines = fines.reduce((sum, f) => sum + f.amount, 0);
   const unpaidFines = fines.filter((f) => f.status === 'Unpaid').reduce((sum, f) => sum + f.amount, 0);
@@ -112,6 +117,7 @@ const AdminFines = () => {
         <button
           onClick={() => {
             resetForm();
+            loadEmployees();
             setModalOpen(true);
           }}
           className="gradient-primary text-primary-foreground px-6 py-3 rounded-2xl font-bold shadow-lg shadow-primary/20 active:scale-95 transition-all flex items-center gap-2"
@@ -167,7 +173,7 @@ const AdminFines = () => {
           <tbody className="divide-y divide-border">
             {fines.map((fine) => (
               <tr key={fine.id} className="hover:bg-secondary/50 transition-colors" data-testid={`fine-row-${fine.id}`}>
-                <td className="px-8 py-6 font-bold text-foreground">{getEmployeeName(fine.employee_id)}</td>
+                <td className="px-8 py-6 font-bold text-foreground">{getEmployeeName(fine)}</td>
                 <td className="px-8 py-6 text-muted-foreground">{fine.reason}</td>
                 <td className="px-8 py-6 font-bold text-destructive">₨ {fine.amount.toLocaleString()}</td>
                 <td className="px-8 py-6 text-muted-foreground">{fine.date}</td>
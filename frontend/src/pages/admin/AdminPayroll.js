@@ -1,14 +1,21 @@
 import React, { useState, useEffect } from 'react';
-import { payrollAPI, employeeAPI, fineAPI } from '../../lib/api';
+import { payrollAPI, jobAPI } from '../../lib/api';
 import { toast } from 'sonner';
 import { DollarSign, CheckCircle, Clock, Download, CreditCard } from 'lucide-react';
 
+const DEDUCTION_LABELS = [
+  ['fine_deduction', 'Fines'],
+  ['late_deduction', 'Late'],
+  ['half_day_deduction', 'Half days'],
+  ['absent_deduction', 'Absences'],
+  ['leave_deduction', 'Unpaid leave'],
+];
+
 const AdminPayroll = () => {
   const [employees, setEmployees] = useState([]);
-  const [payrollStatus, setPayrollStatus] = useState({});
-  const [fines, setFines] = useState([]);
   const [loading, setLoading] = useState(true);
   const [isProcessing, setIsProcessing] = useState(false);
+  const [processingPhase, setProcessingPhase] = useState('');
 
   useEffect(() => {
     loadData();
@@ -16,14 +23,8 @@ const AdminPayroll = () => {
 
   const loadData = async () => {
     try {
-      const [empData, statusData, finesData] = await Promise.all([
-        employeeAPI.getAll(),
-        payrollAPI.getStatus(),
-        fineAPI.getAll(),
-      ]);
-      setEmployees(empData.filter((e) => e.role === 'EMPLOYEE'));
-      setPayrollStatus(statusData);
-      setFines(finesData);
+      const sheet = await payrollAPI.getSheet();
+      setEmployees(sheet);
     } catch (error) {
       console.error('Failed to load data:', error);
     } finally {
@@ -34,13 +35,19 @@ const AdminPayroll = () => {
   const processPayroll = async () => {
     setIsProcessing(true);
     try {
-      await payrollAPI.process({});
+      const job = await payrollAPI.process({ background: true });
+      const result = await jobAPI.wait(job.id, (j) => setProcessingPhase(j.progress?.phase || ''));
       await loadData();
-      toast.success('Payroll processed successfully!');
+      if (result.status === 'succeeded') {
+        toast.success('Payroll processed successfully!');
+      } else {
+        toast.error(result.status === 'cancelled' ? 'Payroll run was cancelled' : 'Failed to process payroll');
+      }
     } catch (error) {
       toast.error('Failed to process payroll');
     } finally {
       setIsProcessing(false);
+      setProcessingPhase('');
     }
   };
 
@@ -54,13 +61,8 @@ const AdminPayroll = () => {
     }
   };
 
-  const getEmployeeFines = (empId) => {
-    return fines.filter((f) => f.employee_id === empId && f.status === 'Unpaid')
-      .reduce((sum, f) => sum + f.amount, 0);
-  };
-
   const totalPayroll = employees.reduce((sum, emp) => sum + (emp.salary || 0), 0);
-  const paidCount = Object.values(payrollStatus).filter((s) => s === 'Paid').length;
+  const paidCount = employees.filter((emp) => emp.status === 'Paid').length;
 
   if (loading) {
     return (
@@ -86,7 +88,7 @@ const AdminPayroll = () => {
           {isProcessing ? (
             <>
               <div className="w-5 h-5 border-2 border-primary-foreground/30 border-t-primary-foreground rounded-full animate-spin" />
-              Processing...
+              {processingPhase ? `Processing (${processingPhase.replace(/_/g, ' ')})...` : 'Processing...'}
             </>
           ) : (
             <>
@@ -142,9 +144,11 @@ const AdminPayroll = () => {
           </thead>
           <tbody className="divide-y divide-border">
             {employees.map((emp) => {
-              const isPaid = payrollStatus[emp.id] === 'Paid';
-              const empFines = getEmployeeFines(emp.id);
-              const netSalary = (emp.salary || 0) - empFines;
+              const isPaid = emp.status === 'Paid';
+              // Paid rows carry the payslip that was paid; the rest are what processing would pay now
+              const deductions = emp.deductions || 0;
+              const netSalary = emp.net_salary ?? (emp.salary || 0) - deductions;
+              const breakdown = DEDUCTION_LABELS.filter(([field]) => emp[field] > 0);
               return (
                 <tr key={emp.id} className="hover:bg-secondary/50 transition-colors" data-testid={`payroll-row-${emp.id}`}>
                   <td className="px-8 py-6">
@@ -157,7 +161,14 @@ const AdminPayroll = () => {
                   </td>
                   <td className="px-8 py-6 text-muted-foreground">{emp.designation}</td>
                   <td className="px-8 py-6 font-bold text-foreground">₨ {(emp.salary || 0).toLocaleString()}</td>
-                  <td className="px-8 py-6 font-bold text-destructive">₨ {empFines.toLocaleString()}</td>
+                  <td className="px-8 py-6">
+                    <p className="font-bold text-destructive">₨ {deductions.toLocaleString()}</p>
+                    {breakdown.map(([field, label]) => (
+                      <p key={field} className="text-[10px] text-muted-foreground">
+                        {label}: ₨ {emp[field].toLocaleString()}
+                      </p>
+                    ))}
+                  </td>
                   <td className="px-8 py-6 font-bold text-success">₨ {netSalary.toLocaleString()}</td>
                   <td className="px-8 py-6">
                     <span className={`px-4 py-1.5 rounded-full text-[10px] font-bold uppercase tracking-widest border ${
@@ -13,6 +13,14 @@ const AVAILABLE_MODULES = [
   { id: 'salary', label: 'Salary' },
 ];
 
+// Attendance-based payroll deductions; all off unless enabled here (fines are always deducted)
+const PAYROLL_DEDUCTIONS = [
+  { id: 'deduct_late', label: 'Late arrivals (late fine per late day not already fined)' },
+  { id: 'deduct_half_days', label: 'Half days (half a day\'s pay)' },
+  { id: 'deduct_absences', label: 'Absences (a day\'s pay)' },
+  { id: 'deduct_unpaid_leave', label: 'Leave outside the leave policy (a day\'s pay)' },
+];
+
 const AdminSettings = () => {
   const { user } = useAuth();
   const { theme, toggleTheme } = useTheme();
@@ -26,6 +34,7 @@ const AdminSettings = () => {
     office_end_time: '18:00',
     late_fine_amount: 100,
     half_day_hours: 4,
+    salary_settings: {},
   });
   const [loading, setLoading] = useState(true);
 
@@ -46,6 +55,7 @@ const AdminSettings = () => {
           office_end_time: settingsData.office_end_time || '18:00',
           late_fine_amount: settingsData.late_fine_amount || 100,
           half_day_hours: settingsData.half_day_hours || 4,
+          salary_settings: settingsData.salary_settings || {},
         });
       }
     } catch (error) {
@@ -220,6 +230,27 @@ const AdminSettings = () => {
             />
           </div>
         </div>
+        <div className="mt-6">
+          <p className="text-xs font-bold text-muted-foreground uppercase tracking-widest mb-3">Payroll Deductions</p>
+          <div className="grid sm:grid-cols-2 gap-3">
+            {PAYROLL_DEDUCTIONS.map((deduction) => (
+              <label key={deduction.id} className="flex items-center gap-3 p-3 bg-secondary rounded-xl cursor-pointer text-sm text-foreground">
+                <input
+                  type="checkbox"
+                  checked={Boolean(settings.salary_settings[deduction.id])}
+                  onChange={(e) =>
+                    setSettings({
+                      ...settings,
+                      salary_settings: { ...settings.salary_settings, [deduction.id]: e.target.checked },
+                    })
+                  }
+                  data-testid={`deduction-${deduction.id}`}
+                />
+                {deduction.label}
+              </label>
+            ))}
+          </div>
+        </div>
         <button
           onClick={handleSaveSettings}
           className="mt-6 px-8 py-3 gradient-primary text-primary-foreground font-bold rounded-xl shadow-lg active:scale-95 transition-transform"
@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
-import { employeeAPI } from '../../lib/api';
+import { employeeAPI, mediaAPI, mediaUrl } from '../../lib/api';
 import { toast } from 'sonner';
 import { UserPlus, Edit2, Trash2, X, Camera, IdCard } from 'lucide-react';
 
@@ -40,18 +40,19 @@ const EmployeeManagement = () => {
     }
   };
 
-  const handleImageChange = (e) => {
+  const handleImageChange = async (e) => {
     const file = e.target.files?.[0];
     if (file) {
       if (file.size > 2 * 1024 * 1024) {
         toast.error('Image size should be less than 2MB');
         return;
       }
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        setFormData({ ...formData, profile_pic: reader.result });
-      };
-      reader.readAsDataURL(file);
+      try {
+        const uploaded = await mediaAPI.upload(file);
+        setFormData((prev) => ({ ...prev, profile_pic: uploaded.thumbnail_url }));
+      } catch (error) {
+        toast.error(error.response?.data?.detail || 'Failed to upload image');
+      }
     }
   };
 
@@ -158,7 +159,7 @@ const EmployeeManagement = () => {
             <div className="flex items-center gap-4 mb-4">
               <div className="w-14 h-14 bg-primary/10 rounded-2xl flex items-center justify-center text-primary font-bold text-xl overflow-hidden">
                 {emp.profile_pic ? (
-                  <img src={emp.profile_pic} alt={emp.name} className="w-full h-full object-cover" />
+                  <img src={mediaUrl(emp.profile_pic)} alt={emp.name} className="w-full h-full object-cover" />
                 ) : (
                   emp.name.charAt(0)
                 )}
@@ -222,7 +223,7 @@ const EmployeeManagement = () => {
                   className="relative w-24 h-24 rounded-2xl bg-secondary border-2 border-dashed border-border hover:border-primary transition-colors cursor-pointer overflow-hidden group"
                 >
                   {formData.profile_pic ? (
-                    <img src={formData.profile_pic} alt="Profile" className="w-full h-full object-cover" />
+                    <img src={mediaUrl(formData.profile_pic)} alt="Profile" className="w-full h-full object-cover" />
                   ) : (
                     <div className="w-full h-full flex flex-col items-center justify-center text-muted-foreground">
                       <Camera className="w-8 h-8 mb-1" />
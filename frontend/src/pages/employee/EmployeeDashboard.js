@@ -20,9 +20,9 @@ const EmployeeDashboard = ({ user, onNavigate }) => {
   const loadStats = async () => {
     try {
       const [attendance, leaves, fines, payrollStatus] = await Promise.all([
-        attendanceAPI.getAll({ employee_id: user.id }),
-        leaveAPI.getAll({ employee_id: user.id }),
-        fineAPI.getAll({ employee_id: user.id }),
+        attendanceAPI.getAll({ employee_id: user.id, fields: 'date,status' }),
+        leaveAPI.getAll({ employee_id: user.id, fields: 'status' }),
+        fineAPI.getAll({ employee_id: user.id, fields: 'status,amount' }),
         payrollAPI.getStatus(),
       ]);
 
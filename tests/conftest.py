@@ -0,0 +1,48 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "hrms_test")
+os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+
+import server as server_module  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    # A fresh module per test: caches, version counters and the job runner are module-level state
+    module = importlib.reload(server_module)
+    mongo = AsyncMongoMockClient()
+    module.client = mongo
+    module.db = mongo[os.environ["DB_NAME"]]
+    module.reporting_db = module.db
+    return module
+
+
+@pytest.fixture
+def client(server):
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+
+def login(client, username="admin", password="123"):
+    response = client.post("/api/auth/login", json={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+@pytest.fixture
+def admin(client):
+    return login(client)
+
+
+def call(client, fn, *args, **kwargs):
+    # Runs a coroutine function on the app's event loop (Motor objects are bound to it)
+    return client.portal.call(lambda: fn(*args, **kwargs))
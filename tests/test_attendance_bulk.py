@@ -0,0 +1,156 @@
+import os
+
+import orjson
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+from .conftest import call, login
+
+
+def strip_round(stage):
+    # mongomock has no $round; the rounding itself is not under test here
+    if isinstance(stage, dict):
+        if "$round" in stage:
+            return strip_round(stage["$round"][0])
+        return {key: strip_round(value) for key, value in stage.items()}
+    if isinstance(stage, list):
+        return [strip_round(value) for value in stage]
+    return stage
+
+
+@pytest.fixture
+def rollups(server, monkeypatch):
+    # Rollup rebuilds use $merge, which mongomock lacks; record what would be rebuilt instead
+    calls = []
+
+    async def rebuild(pairs=None):
+        calls.append(pairs)
+
+    merge = server.punch_merge_pipeline
+    monkeypatch.setattr(server, "punch_merge_pipeline", lambda *args: strip_round(merge(*args)))
+    monkeypatch.setattr(server, "rebuild_attendance_rollups", rebuild)
+    return calls
+
+
+def upload(client, headers, rows):
+    body = "\n".join(row if isinstance(row, str) else orjson.dumps(row).decode() for row in rows)
+    return client.post("/api/attendance/bulk", content=body, headers={**headers, "Content-Type": "application/x-ndjson"})
+
+
+def day_records(client, headers, date):
+    return client.get("/api/attendance", params={"date": date}, headers=headers).json()
+
+
+def test_punches_merge_into_one_record_per_day(client, admin, rollups):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["role"] == "EMPLOYEE"][0]
+    response = upload(client, admin, [
+        {"employee_id": employee["id"], "date": "2026-10-12", "time": "09:10"},
+        {"employee_id": employee["id"], "timestamp": "2026-10-12T17:30:00+00:00"},
+        {"employee_code": employee["employee_id"], "date": "2026-10-12", "time": "08:55"},
+        {"employee_code": "NOPE", "date": "2026-10-12", "time": "08:55"},
+        {"employee_id": employee["id"]},
+        "not json",
+    ])
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["accepted"], report["rejected"], report["failed"], report["records"]) == (6, 3, 3, 0, 1)
+    assert [row["status"] for row in report["results"]] == ["accepted"] * 3 + ["rejected"] * 3
+    assert rollups == [[(employee["id"], "2026-10")]]
+
+    [record] = day_records(client, admin, "2026-10-12")
+    assert (record["check_in"], record["check_out"]) == ("08:55", "17:30")
+    assert record["method"] == "Biometric"
+    assert record["is_late"] is False and record["status"] == "Present"
+
+
+def test_later_uploads_widen_the_existing_record(client, admin, rollups):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["role"] == "EMPLOYEE"][0]
+    upload(client, admin, [{"employee_id": employee["id"], "date": "2026-10-12", "time": "09:30"}])
+    [record] = day_records(client, admin, "2026-10-12")
+    assert record["is_late"] is True and record["check_out"] is None
+
+    report = upload(client, admin, [
+        {"employee_id": employee["id"], "date": "2026-10-12", "time": "18:30"},
+        {"employee_id": employee["id"], "date": "2026-10-12", "time": "12:00"},
+    ]).json()
+    assert (report["upserted"], report["modified"]) == (0, 1)
+    [updated] = day_records(client, admin, "2026-10-12")
+    assert updated["id"] == record["id"]
+    assert (updated["check_in"], updated["check_out"]) == ("09:30", "18:30")
+    assert updated["working_hours"] == pytest.approx(9.0)
+
+
+def test_empty_upload_and_permissions(client, admin, rollups):
+    assert upload(client, admin, []).json()["received"] == 0
+    assert upload(client, login(client, "babar", "12345678"), []).status_code == 403
+
+
+def test_write_failures_are_reported_apart_from_bad_lines(server, client, admin, rollups, monkeypatch):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["role"] == "EMPLOYEE"][0]
+
+    async def bulk_write(self, operations, ordered=True):
+        raise BulkWriteError({"writeErrors": [{"index": 0, "errmsg": "disk full"}], "nUpserted": 0, "nModified": 0})
+
+    monkeypatch.setattr(type(server.db.attendance), "bulk_write", bulk_write)
+    report = upload(client, admin, [
+        {"employee_id": employee["id"], "date": "2026-10-12", "time": "09:10"},
+        {"employee_id": employee["id"], "date": "2026-10-12", "time": "18:10"},
+        "not json",
+    ]).json()
+    assert (report["accepted"], report["rejected"], report["failed"], report["records"]) == (0, 1, 2, 0)
+    assert [row["status"] for row in report["results"]] == ["failed", "failed", "rejected"]
+    assert report["results"][0]["error"] == "disk full"
+    assert rollups == []
+
+
+def test_lines_split_across_chunks_are_joined(server, client, admin, rollups):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["role"] == "EMPLOYEE"][0]
+    body = "\n".join(orjson.dumps({"employee_id": employee["id"], "date": "2026-10-12", "time": t}).decode()
+                     for t in ("09:10", "12:00", "18:10")).encode()
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+    response = client.post("/api/attendance/bulk", content=iter(chunks),
+                           headers={**admin, "Content-Type": "application/x-ndjson"})
+    assert response.json()["accepted"] == 3
+    assert [row["line"] for row in response.json()["results"]] == [1, 2, 3]
+
+
+def test_oversized_lines_and_bodies_are_refused(server, client, admin, rollups):
+    server.UPLOAD_MAX_LINE_BYTES = 64
+    response = upload(client, admin, ['{"employee_id": "x"}', "x" * 65])
+    assert response.status_code == 413
+    assert response.json()["detail"] == "Line 2 is longer than 64 bytes"
+
+    server.UPLOAD_MAX_BYTES = 100
+    assert upload(client, admin, ['{"employee_id": "x"}'] * 10).status_code == 413
+
+
+# mongomock has neither $merge nor $round, so the real rollup path needs a MongoDB server:
+# MONGO_TEST_URL=mongodb://localhost:27017 python -m pytest tests/test_attendance_bulk.py
+@pytest.fixture
+def real_mongo(server):
+    url = os.environ.get("MONGO_TEST_URL")
+    if not url:
+        pytest.skip("MONGO_TEST_URL is not set")
+    server.client = server.AsyncIOMotorClient(url)
+    server.db = server.client[f"{os.environ['DB_NAME']}_rollups"]
+    server.reporting_db = server.db
+    yield server
+    MongoClient(url).drop_database(server.db.name)
+
+
+def test_uploads_rebuild_monthly_rollups_with_merge(real_mongo, client, admin):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["role"] == "EMPLOYEE"][0]
+    upload(client, admin, [
+        {"employee_id": employee["id"], "date": "2026-10-12", "time": "09:30"},
+        {"employee_id": employee["id"], "date": "2026-10-12", "time": "18:00"},
+        {"employee_id": employee["id"], "date": "2026-10-13", "time": "08:50"},
+    ])
+    # A second upload for the month replaces the rollup instead of adding a duplicate
+    upload(client, admin, [{"employee_id": employee["id"], "date": "2026-10-13", "time": "17:50"}])
+
+    rollups = call(client, real_mongo.db.attendance_monthly.find({"employee_id": employee["id"]}, {"_id": 0}).to_list, None)
+    assert len(rollups) == 1
+    [rollup] = rollups
+    assert (rollup["month"], rollup["days"], rollup["late"]) == ("2026-10", 2, 1)
+    assert rollup["working_hours"] == pytest.approx(8.5 + 9.0)
@@ -0,0 +1,51 @@
+import orjson
+import pytest
+
+from .conftest import call
+
+import server
+
+
+def test_events_are_serialized_once_as_sse_frames():
+    feed = server.AttendanceFeed(queue_size=4)
+    first, second = feed.subscribe(), feed.subscribe()
+    feed.publish(server.attendance_event("check_in", {"_id": "x", "employee_id": "e1", "date": "2026-10-01"}))
+
+    employee_id, frame = first.get_nowait()
+    assert employee_id == "e1"
+    assert second.get_nowait()[1] is frame
+    header, data = frame.decode().rstrip("\n").split("\n")
+    assert header == "event: check_in"
+    assert orjson.loads(data.removeprefix("data: "))["attendance"] == {"employee_id": "e1", "date": "2026-10-01"}
+
+
+def test_stalled_subscribers_are_dropped():
+    feed = server.AttendanceFeed(queue_size=1)
+    queue = feed.subscribe()
+    for _ in range(2):
+        feed.publish(server.attendance_event("update", {"employee_id": "e1", "date": "2026-10-01"}))
+    assert feed.dropped == 1
+    assert queue not in feed.subscribers
+    assert queue.get_nowait() is None
+
+
+def test_streams_take_a_short_lived_ticket_instead_of_the_login_token(server, client, admin):
+    ticket = client.post("/api/attendance/stream/ticket", headers=admin).json()["ticket"]
+    user = call(client, server.get_stream_user, ticket, None)
+    assert user["username"] == "admin"
+
+    login_token = admin["Authorization"].removeprefix("Bearer ")
+    for bad in (login_token, None):
+        with pytest.raises(server.HTTPException) as error:
+            call(client, server.get_stream_user, bad, None)
+        assert error.value.status_code == 401
+    # Nor is a ticket good for anything but opening a stream
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+
+
+def test_expired_tickets_are_refused(server, client, admin):
+    server.STREAM_TICKET_TTL = -1
+    ticket = client.post("/api/attendance/stream/ticket", headers=admin).json()["ticket"]
+    with pytest.raises(server.HTTPException) as error:
+        call(client, server.get_stream_user, ticket, None)
+    assert error.value.detail == "Token expired"
@@ -0,0 +1,38 @@
+from .conftest import call, login
+
+
+def another_worker_writes(client, server, employee_id, changes):
+    # Straight to the database, as a different process would: this worker's cache is not told
+    call(client, server.db.employees.update_one, {"id": employee_id}, {"$set": changes})
+    call(client, server.db.collection_versions.update_one, {"_id": "employees"}, {"$inc": {"version": 1}}, upsert=True)
+
+
+def test_cached_principals_follow_writes_from_other_workers(server, client, admin):
+    server.collection_versions.revalidate_seconds = 0
+    headers = login(client, "babar", "12345678")
+    me = client.get("/api/auth/me", headers=headers).json()
+    assert me["role"] == "EMPLOYEE"
+
+    call(client, server.db.employees.update_one, {"id": me["id"]}, {"$set": {"role": "LEAD"}})
+    # Without a version bump the cached principal is still served
+    assert client.get("/api/auth/me", headers=headers).json()["role"] == "EMPLOYEE"
+
+    another_worker_writes(client, server, me["id"], {"role": "ADMIN"})
+    assert client.get("/api/auth/me", headers=headers).json()["role"] == "ADMIN"
+
+
+def test_deleted_employees_are_locked_out_on_every_worker(server, client, admin):
+    server.collection_versions.revalidate_seconds = 0
+    headers = login(client, "babar", "12345678")
+    me = client.get("/api/auth/me", headers=headers).json()
+
+    call(client, server.db.employees.delete_one, {"id": me["id"]})
+    call(client, server.db.collection_versions.update_one, {"_id": "employees"}, {"$inc": {"version": 1}}, upsert=True)
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+
+def test_password_change_moves_the_employees_version(server, client):
+    headers = login(client, "babar", "12345678")
+    before = call(client, server.collection_versions.get, "employees")
+    assert client.post("/api/auth/change-password", json={"new_password": "changed"}, headers=headers).status_code == 200
+    assert call(client, server.collection_versions.get, "employees") > before
@@ -0,0 +1,17 @@
+def test_duplicate_username_is_rejected_by_index(client, admin):
+    body = {"name": "Hina", "username": "hina", "password": "pw1234", "designation": "QA"}
+    assert client.post("/api/employees", json=body, headers=admin).status_code == 200
+    response = client.post("/api/employees", json={**body, "name": "Other Hina"}, headers=admin)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already exists"
+    assert len([e for e in client.get("/api/employees", headers=admin).json() if e["username"] == "hina"]) == 1
+
+
+def test_second_attendance_for_same_day_is_rejected(client, admin):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["role"] == "EMPLOYEE"][0]
+    body = {"employee_id": employee["id"], "date": "2026-10-05"}
+    assert client.post("/api/attendance", json=body, headers=admin).status_code == 200
+    response = client.post("/api/attendance", json=body, headers=admin)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Already checked in today"
+    assert len(client.get("/api/attendance", params={"employee_id": employee["id"]}, headers=admin).json()) == 1
@@ -0,0 +1,107 @@
+import orjson
+from fastapi import HTTPException
+
+from .conftest import login
+
+CSV = (
+    "﻿name,username,password,designation,salary,department,allowed_modules\r\n"
+    "Ali,ali,pw1234,Dev,50000,Development,dashboard;attendance\r\n"
+    '"Khan, Jr",khan,pw1234,"Multi\nline",,,\r\n'
+    "Dup,ali,pw,Dev,1,,\r\n"
+    "Babar Again,babar,pw,Designer,1,,\r\n"
+    "Bad,bad,pw,Dev,abc,,\r\n"
+)
+
+
+def ndjson(*rows):
+    return "\n".join(orjson.dumps(row).decode() for row in rows)
+
+
+def usernames(client, headers):
+    return {e["username"]: e for e in client.get("/api/employees", headers=headers).json()}
+
+
+def post_import(client, headers, body, content_type="application/x-ndjson", **params):
+    return client.post("/api/employees/import", params=params, content=body,
+                       headers={**headers, "Content-Type": content_type})
+
+
+def test_csv_import_reports_every_row(client, admin):
+    dry = post_import(client, admin, CSV, "text/csv", dry_run=True).json()
+    assert (dry["received"], dry["valid"], dry["rejected"]) == (5, 2, 3)
+    assert "ali" not in usernames(client, admin)
+
+    report = post_import(client, admin, CSV, "text/csv").json()
+    assert (report["created"], report["updated"], report["failed"], report["rejected"]) == (2, 0, 0, 3)
+    errors = {row["line"]: row.get("error") for row in report["results"] if row["status"] == "rejected"}
+    assert errors[5] == "Duplicate username in this file"
+    assert errors[6] == "Username already exists"
+    assert errors[7].startswith("salary")
+    employees = usernames(client, admin)
+    assert employees["khan"]["designation"] == "Multi\nline"
+    assert employees["ali"]["allowed_modules"] == ["dashboard", "attendance"]
+    assert client.post("/api/auth/login", json={"username": "ali", "password": "pw1234"}).status_code == 200
+
+
+def test_upsert_only_touches_supplied_columns(client, admin):
+    report = post_import(client, admin, ndjson(
+        {"name": "Babar A", "username": "babar", "password": "ignored", "designation": "Lead Designer"}
+    ), mode="upsert").json()
+    assert report["updated"] == 1
+    babar = usernames(client, admin)["babar"]
+    assert babar["designation"] == "Lead Designer"
+    assert babar["salary"] == 45000
+    # An existing account's password is never replaced by an import
+    assert client.post("/api/auth/login", json={"username": "babar", "password": "12345678"}).status_code == 200
+
+
+def test_row_cap_is_enforced_before_any_write(server, client, admin):
+    server.EMPLOYEE_IMPORT_MAX_ROWS = 2
+    server.EMPLOYEE_IMPORT_CHUNK_SIZE = 1
+    rows = [{"name": f"N{i}", "username": f"n{i}", "password": "pw", "designation": "d"} for i in range(3)]
+    response = post_import(client, admin, ndjson(*rows))
+    assert response.status_code == 413
+    assert not {"n0", "n1", "n2"} & set(usernames(client, admin))
+
+
+def test_partial_failure_reports_rows_and_invalidates_etags(server, client, admin, monkeypatch):
+    server.EMPLOYEE_IMPORT_CHUNK_SIZE = 1
+    before = client.get("/api/employees", headers=admin)
+    etag = before.headers["etag"]
+
+    hash_many = server.password_hasher.hash_many
+    calls = []
+
+    async def busy_after_first(passwords):
+        calls.append(passwords)
+        if len(calls) > 1:
+            raise HTTPException(status_code=503, detail="Password hashing is busy, retry shortly")
+        return await hash_many(passwords)
+
+    monkeypatch.setattr(server.password_hasher, "hash_many", busy_after_first)
+    rows = [{"name": f"N{i}", "username": f"n{i}", "password": "pw", "designation": "d"} for i in range(3)]
+    response = post_import(client, admin, ndjson(*rows))
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["created"], report["failed"]) == (1, 2)
+    assert [row["status"] for row in report["results"]] == ["created", "failed", "failed"]
+    assert report["results"][1]["error"] == "Not imported: Password hashing is busy, retry shortly"
+
+    after = client.get("/api/employees", headers={**admin, "If-None-Match": etag})
+    assert after.status_code == 200
+    assert "n0" in {e["username"] for e in after.json()}
+
+
+def test_invalid_mode_and_permissions(client, admin):
+    assert post_import(client, admin, "", mode="replace").status_code == 422
+    assert post_import(client, login(client, "babar", "12345678"), "").status_code == 403
+
+
+def test_bad_profile_picture_rejects_only_its_row(server, client, admin, tmp_path):
+    server.MEDIA_ROOT = tmp_path
+    report = post_import(client, admin, ndjson(
+        {"name": "A", "username": "pic1", "password": "pw", "designation": "d", "profile_pic": "data:image/png;base64,AAAA"},
+        {"name": "B", "username": "pic2", "password": "pw", "designation": "d"},
+    )).json()
+    assert [row["status"] for row in report["results"]] == ["rejected", "created"]
+    assert client.post("/api/auth/login", json={"username": "pic2", "password": "pw"}).status_code == 200
@@ -0,0 +1,36 @@
+import pytest
+from openpyxl import load_workbook
+
+from .conftest import call
+
+PAYLOAD = '=HYPERLINK("http://evil.example","click")'
+
+
+@pytest.fixture
+def hostile_fine(client, admin):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["username"] == "babar"][0]
+    response = client.post("/api/fines", json={"employee_id": employee["id"], "amount": 100, "reason": PAYLOAD,
+                                               "date": "2026-09-01"}, headers=admin)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_csv_cells_are_not_formulas(client, admin, hostile_fine):
+    response = client.get("/api/exports/fines", headers=admin)
+    assert response.status_code == 200
+    assert f"'{PAYLOAD}".replace('"', '""') in response.text
+
+
+def test_xlsx_cells_are_not_formulas(server, client, admin, hostile_fine, tmp_path):
+    server.EXPORT_DIR = tmp_path
+    job = {"id": "export-1", "type": "export", "status": "running", "lease_owner": server.job_runner.worker_id,
+           "params": {"report": "fines", "filters": {}}, "progress": {}, "timings": {}}
+    call(client, server.db.jobs.insert_one, dict(job))
+
+    result = call(client, server.export_job, server.JobContext(job, server.job_runner))
+    assert result["rows"] == 1
+    sheet = load_workbook(tmp_path / "export-1.xlsx")["Fines"]
+    header, row = list(sheet.iter_rows())
+    reason = row[[cell.value for cell in header].index("Reason")]
+    # Kept verbatim, but as a text cell rather than a formula
+    assert (reason.value, reason.data_type) == (PAYLOAD, "s")
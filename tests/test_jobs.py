@@ -0,0 +1,59 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from .conftest import call
+
+
+def running_payroll_job(client, server):
+    now = datetime.now(timezone.utc)
+    job = {
+        "id": "job-1", "type": "payroll", "status": "running", "lease_owner": server.job_runner.worker_id,
+        "params": {"month": now.strftime("%m"), "year": now.strftime("%Y")}, "progress": {}, "timings": {}
+    }
+    call(client, server.db.jobs.insert_one, dict(job))
+    return server.JobContext(job, server.job_runner)
+
+
+def cancel_at(monkeypatch, server, ctx, phase):
+    # Requests the cancel right after `phase` completes, before its checkpoint is written
+    record_phase = ctx.record_phase
+
+    async def record(name, elapsed_ms, final=False):
+        if name == phase:
+            await server.db.jobs.update_one({"id": ctx.id}, {"$set": {"cancel_requested": True}})
+        await record_phase(name, elapsed_ms, final=final)
+
+    monkeypatch.setattr(ctx, "record_phase", record)
+
+
+@pytest.fixture
+def fined_employee(client, admin):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["username"] == "babar"][0]
+    client.post("/api/fines", json={"employee_id": employee["id"], "amount": 500, "reason": "Damage",
+                                    "date": datetime.now(timezone.utc).strftime("%Y-%m-%d")}, headers=admin)
+    return employee
+
+
+def test_cancel_after_payslips_are_written_still_settles_fines(server, client, admin, fined_employee, monkeypatch):
+    ctx = running_payroll_job(client, server)
+    cancel_at(monkeypatch, server, ctx, "write_payslips")
+
+    result = call(client, server.payroll_job, ctx)
+    assert result["processed"] >= 1
+    assert ctx.cancel_requested
+    payslip = call(client, server.db.payroll.find_one, {"employee_id": fined_employee["id"]})
+    assert (payslip["status"], payslip["fine_deduction"]) == ("Paid", 500)
+    fines = client.get("/api/fines", params={"employee_id": fined_employee["id"]}, headers=admin).json()
+    assert [fine["status"] for fine in fines] == ["Paid"]
+
+
+def test_cancel_before_payslips_are_written_stops_the_run(server, client, admin, fined_employee, monkeypatch):
+    ctx = running_payroll_job(client, server)
+    cancel_at(monkeypatch, server, ctx, "calculate")
+
+    with pytest.raises(server.JobCancelled):
+        call(client, server.payroll_job, ctx)
+    assert call(client, server.db.payroll.count_documents, {}) == 0
+    fines = client.get("/api/fines", params={"employee_id": fined_employee["id"]}, headers=admin).json()
+    assert [fine["status"] for fine in fines] == ["Unpaid"]
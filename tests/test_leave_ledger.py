@@ -0,0 +1,138 @@
+import pytest
+
+from .conftest import call, login
+
+# Mon 2026-01-05 .. Fri 2026-01-16 is 10 working days; annual entitlement is 12
+
+
+@pytest.fixture
+def employee(client, admin):
+    return [e for e in client.get("/api/employees", headers=admin).json() if e["username"] == "babar"][0]
+
+
+def file_leave(client, headers, employee, leave_type, start, end, **extra):
+    body = {"employee_id": employee["id"], "employee_name": employee["name"], "type": leave_type,
+            "start_date": start, "end_date": end, "reason": "r", **extra}
+    return client.post("/api/leaves", json=body, headers=headers)
+
+
+def balance(client, headers, employee, leave_type="annual", year="2026"):
+    rows = client.get("/api/leaves/balances", params={"employee_id": employee["id"], "year": year}, headers=headers).json()
+    return {row["type"]: row for row in rows}[leave_type]
+
+
+def legacy_leave(client, server, employee, leave_id, status, start="2026-01-05", end="2026-01-16"):
+    # As filed before the ledger existed: no ledger_type / ledger_days
+    call(client, server.db.leaves.insert_one, {
+        "id": leave_id, "employee_id": employee["id"], "employee_name": employee["name"], "type": "Annual",
+        "start_date": start, "end_date": end, "reason": "old", "status": status
+    })
+
+
+def test_submit_reserves_pending_days_and_refuses_over_balance(client, admin, employee):
+    leave = file_leave(client, admin, employee, "Annual", "2026-01-05", "2026-01-16")
+    assert leave.status_code == 200
+    assert leave.json()["ledger_days"] == {"2026": 10}
+    row = balance(client, admin, employee)
+    assert (row["used"], row["pending"], row["remaining"], row["available"]) == (0, 10, 12, 2)
+
+    refused = file_leave(client, admin, employee, "Annual", "2026-02-02", "2026-02-04")
+    assert refused.status_code == 400
+    assert refused.json()["detail"] == "Insufficient annual leave for 2026: 2 day(s) available, 3 requested"
+    assert balance(client, admin, employee)["pending"] == 10
+
+
+def test_leaves_spanning_new_year_count_against_both_years(client, admin, employee):
+    leave = file_leave(client, admin, employee, "Sick", "2025-12-29", "2026-01-02").json()
+    assert leave["ledger_days"] == {"2025": 3, "2026": 2}
+    assert balance(client, admin, employee, "sick", "2025")["pending"] == 3
+    assert balance(client, admin, employee, "sick", "2026")["pending"] == 2
+
+
+def test_types_outside_the_policy_are_untracked(client, admin, employee):
+    leave = file_leave(client, admin, employee, "Casual", "2026-03-02", "2026-03-04").json()
+    assert leave["ledger_type"] is None
+    assert file_leave(client, admin, employee, "Annual", "2026-03-05", "2026-03-01").status_code == 400
+
+
+def test_approve_reject_cancel_and_delete(client, admin, employee):
+    first = file_leave(client, admin, employee, "Annual", "2026-01-05", "2026-01-09").json()
+    second = file_leave(client, admin, employee, "Annual", "2026-02-02", "2026-02-04").json()
+    assert balance(client, admin, employee)["pending"] == 8
+
+    client.put(f"/api/leaves/{first['id']}", json={"status": "Approved"}, headers=admin)
+    row = balance(client, admin, employee)
+    assert (row["used"], row["pending"]) == (5, 3)
+
+    client.put(f"/api/leaves/{second['id']}", json={"status": "Rejected"}, headers=admin)
+    row = balance(client, admin, employee)
+    assert (row["used"], row["pending"]) == (5, 0)
+
+    # Moving an approved leave's dates re-counts it against the entitlement
+    grown = client.put(f"/api/leaves/{first['id']}", json={"end_date": "2026-01-23"}, headers=admin)
+    assert grown.status_code == 400
+    assert balance(client, admin, employee)["used"] == 5
+    assert client.get("/api/leaves", headers=admin).json()[0]["end_date"] == "2026-01-09"
+
+    own = login(client, "babar", "12345678")
+    third = file_leave(client, own, employee, "Annual", "2026-03-02", "2026-03-03").json()
+    assert client.delete(f"/api/leaves/{third['id']}", headers=own).status_code == 200
+    assert balance(client, admin, employee)["pending"] == 0
+
+    client.delete(f"/api/leaves/{first['id']}", headers=admin)
+    row = balance(client, admin, employee)
+    assert (row["used"], row["pending"], row["available"]) == (0, 0, 12)
+
+
+def test_legacy_leave_is_counted_when_approved(server, client, admin, employee):
+    legacy_leave(client, server, employee, "old-1", "Pending")
+    client.put("/api/leaves/old-1", json={"status": "Approved"}, headers=admin)
+    row = balance(client, admin, employee)
+    assert (row["used"], row["pending"], row["available"]) == (10, 0, 2)
+    assert file_leave(client, admin, employee, "Annual", "2026-03-02", "2026-03-13").status_code == 400
+
+
+def test_legacy_leave_is_released_when_cancelled_or_deleted(server, client, admin, employee):
+    legacy_leave(client, server, employee, "old-1", "Approved")
+    client.put("/api/leaves/old-1", json={"status": "Cancelled"}, headers=admin)
+    assert balance(client, admin, employee)["used"] == 0
+
+    legacy_leave(client, server, employee, "old-2", "Approved", "2026-02-02", "2026-02-04")
+    client.delete("/api/leaves/old-2", headers=admin)
+    row = balance(client, admin, employee)
+    assert (row["used"], row["pending"]) == (0, 0)
+
+
+def test_backfill_counts_untouched_legacy_leaves_once(server, client, admin, employee):
+    legacy_leave(client, server, employee, "old-1", "Approved")
+    legacy_leave(client, server, employee, "old-2", "Pending", "2026-02-02", "2026-02-06")
+    legacy_leave(client, server, employee, "old-3", "Approved", "2026-02-30", "2026-03-01")
+    assert call(client, server.backfill_leave_ledger) == 3
+    assert call(client, server.backfill_leave_ledger) == 0
+    row = balance(client, admin, employee)
+    # History is recorded as it stands, even past the entitlement
+    assert (row["used"], row["pending"], row["available"]) == (10, 5, -3)
+    assert file_leave(client, admin, employee, "Annual", "2026-03-02", "2026-03-02").status_code == 400
+
+
+def test_rebuild_recomputes_from_history(server, client, admin, employee):
+    approved = file_leave(client, admin, employee, "Annual", "2026-01-05", "2026-01-09").json()
+    client.put(f"/api/leaves/{approved['id']}", json={"status": "Approved"}, headers=admin)
+    file_leave(client, admin, employee, "Sick", "2026-02-02", "2026-02-03")
+    call(client, server.db.leave_balances.update_many, {}, {"$set": {"used": 99, "pending": 99}})
+    call(client, server.db.leave_balances.insert_one, {"employee_id": "gone", "year": "2026", "type": "annual", "used": 1, "pending": 0})
+    # A holiday added since filing is honoured by the rebuild
+    client.put("/api/settings", json={"holidays": ["2026-01-06"]}, headers=admin)
+
+    result = client.post("/api/leaves/balances/rebuild", headers=admin).json()
+    assert (result["leaves"], result["balances"], result["invalid_dates"]) == (2, 2, 0)
+    assert balance(client, admin, employee)["used"] == 4
+    assert balance(client, admin, employee, "sick")["pending"] == 2
+    assert client.get("/api/leaves/balances", params={"employee_id": "gone", "year": "2026"}, headers=admin).json()[0]["used"] == 0
+
+
+def test_balances_are_scoped_for_employees(client, admin, employee):
+    own = login(client, "babar", "12345678")
+    rows = client.get("/api/leaves/balances", params={"employee_id": "someone-else"}, headers=own).json()
+    assert {row["employee_id"] for row in rows} == {employee["id"]}
+    assert client.post("/api/leaves/balances/rebuild", headers=own).status_code == 403
@@ -0,0 +1,66 @@
+import io
+
+from PIL import Image
+
+SVG = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+
+
+def png_bytes():
+    out = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_content_type_comes_from_the_decoded_format(server, client, admin, tmp_path):
+    server.MEDIA_ROOT = tmp_path
+    # A PNG labelled as SVG is stored and served as PNG
+    response = client.post("/api/media", files={"file": ("x.svg", png_bytes(), "image/svg+xml")}, headers=admin)
+    assert response.status_code == 200, response.text
+    served = client.get(response.json()["url"])
+    assert served.headers["content-type"] == "image/png"
+    assert served.headers["x-content-type-options"] == "nosniff"
+    thumb = client.get(response.json()["thumbnail_url"])
+    assert thumb.headers["content-type"] == "image/jpeg"
+
+
+def test_svg_and_non_images_are_rejected(server, client, admin, tmp_path):
+    server.MEDIA_ROOT = tmp_path
+    for name, body, content_type in (("x.svg", SVG, "image/svg+xml"), ("x.png", b"not an image", "image/png")):
+        response = client.post("/api/media", files={"file": (name, body, content_type)}, headers=admin)
+        assert response.status_code == 400
+
+
+def test_inline_data_url_is_sniffed_too(server, client, admin, tmp_path):
+    import base64
+    server.MEDIA_ROOT = tmp_path
+    body = {"name": "Hina", "username": "hina", "password": "pw1234", "designation": "QA",
+            "profile_pic": "data:image/svg+xml;base64," + base64.b64encode(SVG).decode()}
+    assert client.post("/api/employees", json=body, headers=admin).status_code == 400
+
+
+def test_legacy_records_with_unsafe_types_are_served_as_attachments(server, client, tmp_path):
+    server.MEDIA_ROOT = tmp_path
+    store = server.DiskMediaStore(tmp_path)
+    client.portal.call(store.put, "legacy", SVG)
+    client.portal.call(server.db.media.insert_one, {"hash": "legacy", "content_type": "image/svg+xml", "thumb_content_type": "image/svg+xml"})
+    served = client.get("/api/media/legacy")
+    assert served.headers["content-type"] == "application/octet-stream"
+    assert served.headers["content-disposition"] == "attachment"
+
+
+def test_oversized_dimensions_are_rejected_before_decoding(server, client, admin, tmp_path):
+    server.MEDIA_ROOT = tmp_path
+    server.MEDIA_MAX_PIXELS = 10_000
+    out = io.BytesIO()
+    Image.new("1", (200, 100)).save(out, format="PNG")
+    response = client.post("/api/media", files={"file": ("big.png", out.getvalue(), "image/png")}, headers=admin)
+    assert response.status_code == 413
+
+
+def test_thumbnail_is_bounded_and_rgb(server):
+    out = io.BytesIO()
+    Image.new("RGBA", (1200, 600), (0, 0, 255, 128)).save(out, format="PNG")
+    thumb, content_type = server.make_thumbnail(out.getvalue())
+    with Image.open(io.BytesIO(thumb)) as img:
+        assert (img.format, img.mode) == ("JPEG", "RGB")
+        assert img.size == (server.THUMBNAIL_SIZE, server.THUMBNAIL_SIZE // 2)
@@ -0,0 +1,23 @@
+from .conftest import login
+
+
+def test_metrics_require_auth_by_default(client):
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer nonsense"}).status_code == 401
+
+
+def test_metrics_are_admin_only(client, admin):
+    assert client.get("/api/metrics", headers=login(client, "babar", "12345678")).status_code == 403
+    response = client.get("/api/metrics", headers=admin)
+    assert response.status_code == 200
+    assert "hrms_http_request_duration_seconds" in response.text
+
+
+def test_metrics_token(server, client):
+    server.METRICS_TOKEN = "scrape-secret"
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+
+def test_public_metrics_are_opt_in(server, client):
+    server.METRICS_PUBLIC = True
+    assert client.get("/api/metrics").status_code == 200
@@ -0,0 +1,48 @@
+from .conftest import login
+
+
+def test_cursor_walks_every_row_once(client, admin):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["role"] == "EMPLOYEE"][0]
+    for day in range(1, 8):
+        response = client.post("/api/attendance", json={"employee_id": employee["id"], "date": f"2026-10-0{day}"}, headers=admin)
+        assert response.status_code == 200, response.text
+
+    first = client.get("/api/attendance", params={"limit": 3}, headers=admin)
+    assert len(first.json()) == 3
+    assert first.headers["x-next-cursor"]
+
+    dates, after = [], None
+    while True:
+        params = {"limit": 3, **({"after": after} if after else {})}
+        response = client.get("/api/attendance", params=params, headers=admin)
+        dates += [row["date"] for row in response.json()]
+        after = response.headers.get("x-next-cursor")
+        if not after:
+            break
+    assert dates == [f"2026-10-0{day}" for day in range(1, 8)]
+
+
+def test_last_page_has_no_cursor(client, admin):
+    response = client.get("/api/employees", params={"limit": 1000}, headers=admin)
+    assert response.status_code == 200
+    assert "x-next-cursor" not in response.headers
+
+
+def test_invalid_cursor_is_rejected(client, admin):
+    assert client.get("/api/attendance", params={"after": "zz!"}, headers=admin).status_code == 400
+
+
+def test_stream_returns_ndjson_without_secrets(client, admin):
+    response = client.get("/api/employees", params={"stream": "true"}, headers=admin)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert len(response.text.splitlines()) >= 2
+    assert "password" not in response.text
+
+
+def test_employee_only_pages_own_rows(client, admin):
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["role"] == "EMPLOYEE"][0]
+    client.post("/api/attendance", json={"employee_id": employee["id"], "date": "2026-10-01"}, headers=admin)
+    client.post("/api/attendance", json={"employee_id": "someone-else", "date": "2026-10-01"}, headers=admin)
+    own = login(client, employee["username"], "12345678")
+    rows = client.get("/api/attendance", headers=own).json()
+    assert rows and all(row["employee_id"] == employee["id"] for row in rows)
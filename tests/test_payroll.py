@@ -0,0 +1,127 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from .conftest import call
+
+import server
+
+# September 2026 has 22 weekdays; a 22000 salary makes the daily rate 1000
+EMPLOYEES = [{"id": "e1", "name": "Ali", "salary": 22000}, {"id": "e2", "name": "Zed", "salary": "n/a"}]
+ALL_DEDUCTIONS = {flag: True for flag in server.PAYROLL_DEDUCTION_FLAGS}
+
+
+def settings(**overrides):
+    return {
+        "late_fine_amount": 100,
+        "leave_policy": {"annual": 12, "sick": 10},
+        "holidays": [],
+        "salary_settings": {},
+        **overrides
+    }
+
+
+def calculate(fines=(), attendance=(), leaves=(), late_fines=(), **overrides):
+    frame = server.calculate_payroll(
+        EMPLOYEES, list(fines), list(attendance), list(leaves), list(late_fines), settings(**overrides), "09", "2026"
+    )
+    return frame.to_dict("index")
+
+
+ATTENDANCE = [{
+    "_id": "e1",
+    "late_dates": ["2026-09-01", None, "2026-09-02", "2026-09-03"],
+    "half_days": 2,
+    "absent_days": 1
+}]
+LEAVES = [
+    # Unpaid (not a policy type), clipped to Sep 28-30
+    {"employee_id": "e1", "type": "Casual", "start_date": "2026-09-28", "end_date": "2026-10-02"},
+    # Covered by the leave policy, never deducted
+    {"employee_id": "e1", "type": "Annual", "start_date": "2026-09-07", "end_date": "2026-09-08"},
+]
+FINES = [{"_id": "e1", "total": 500, "fine_ids": ["f1"]}]
+LATE_FINES = [{"employee_id": "e1", "date": "2026-09-02"}, {"employee_id": "e1", "date": "2026-09-02"}]
+
+
+def test_only_fines_are_deducted_by_default():
+    row = calculate(FINES, ATTENDANCE, LEAVES, LATE_FINES)["e1"]
+    assert row["working_days"] == 22
+    assert (row["late_count"], row["late_fined_days"], row["half_days"], row["absent_days"]) == (3, 1, 2, 1)
+    assert row["unpaid_leave_days"] == 3
+    assert row["late_deduction"] == row["half_day_deduction"] == row["leave_deduction"] == row["absent_deduction"] == 0
+    assert row["deductions"] == 500
+    assert row["net_salary"] == 21500
+
+
+def test_opted_in_deductions():
+    row = calculate(FINES, ATTENDANCE, LEAVES, LATE_FINES, salary_settings=ALL_DEDUCTIONS)["e1"]
+    # Three late days, one of them already fined
+    assert row["late_deduction"] == 200
+    assert row["half_day_deduction"] == 1000
+    assert row["absent_deduction"] == 1000
+    assert row["leave_deduction"] == 3000
+    assert row["deductions"] == 5700
+    assert row["net_salary"] == 16300
+    assert row["payable_days"] == 22 - 1 - 3 - 1
+
+
+@pytest.mark.parametrize("flag, column", [
+    ("deduct_late", "late_deduction"),
+    ("deduct_half_days", "half_day_deduction"),
+    ("deduct_unpaid_leave", "leave_deduction"),
+    ("deduct_absences", "absent_deduction"),
+])
+def test_each_deduction_has_its_own_flag(flag, column):
+    row = calculate(FINES, ATTENDANCE, LEAVES, LATE_FINES, salary_settings={flag: True})["e1"]
+    assert row[column] > 0
+    assert row["deductions"] == 500 + row[column]
+
+
+def test_holidays_and_weekmask_change_the_daily_rate():
+    row = calculate(attendance=[{"_id": "e1", "late_dates": [], "half_days": 0, "absent_days": 1}],
+                    holidays=["2026-09-14"], salary_settings={"deduct_absences": True})["e1"]
+    assert row["working_days"] == 21
+    assert row["absent_deduction"] == round(22000 / 21, 2)
+
+    row = calculate(salary_settings={"weekmask": "1111110"})["e1"]
+    assert row["working_days"] == 26
+
+
+def test_employees_without_inputs_are_paid_in_full():
+    frame = calculate(salary_settings=ALL_DEDUCTIONS)
+    assert frame["e1"]["net_salary"] == 22000
+    assert frame["e1"]["late_count"] == 0
+    # Unparseable salaries count as zero instead of failing the whole run
+    assert frame["e2"]["base_salary"] == 0
+    assert frame["e2"]["net_salary"] == 0
+
+
+def test_sheet_shows_the_net_that_gets_paid(client, admin):
+    now = datetime.now(timezone.utc)
+    month_prefix = now.strftime("%Y-%m")
+    client.put("/api/settings", json={"salary_settings": ALL_DEDUCTIONS, "late_fine_amount": 100}, headers=admin)
+    employee = [e for e in client.get("/api/employees", headers=admin).json() if e["username"] == "babar"][0]
+    for day, late in (("01", True), ("02", True), ("05", False)):
+        call(client, server.db.attendance.insert_one, {
+            "id": f"a{day}", "employee_id": employee["id"], "date": f"{month_prefix}-{day}",
+            "status": "Late" if late else "Present", "is_late": late, "working_hours": 8
+        })
+    client.post("/api/fines", json={"employee_id": employee["id"], "amount": 300, "reason": "Late arrival",
+                                     "date": f"{month_prefix}-01"}, headers=admin)
+
+    row = [r for r in client.get("/api/payroll/sheet", headers=admin).json() if r["id"] == employee["id"]][0]
+    assert row["status"] is None
+    assert row["late_count"] == 2 and row["late_fined_days"] == 1
+    assert row["late_deduction"] == 100
+    assert row["fine_deduction"] == row["unpaid_fines"] == 300
+    assert row["net_salary"] == round(row["base_salary"] - row["deductions"], 2)
+
+    paid = client.post(f"/api/payroll/pay/{employee['id']}", headers=admin).json()
+    assert paid["net_salary"] == row["net_salary"]
+
+    # Once paid, the sheet keeps showing the payslip even though the fine is now settled
+    after = [r for r in client.get("/api/payroll/sheet", headers=admin).json() if r["id"] == employee["id"]][0]
+    assert after["status"] == "Paid"
+    assert after["net_salary"] == row["net_salary"]
+    assert after["unpaid_fines"] == 0
@@ -0,0 +1,21 @@
+from .conftest import call
+
+
+def test_change_without_full_document_reloads(client, server):
+    cache = server.settings_cache
+    call(client, cache.get)
+    call(client, server.db.settings.update_one, {"id": "settings"}, {"$set": {"office_start_time": "10:00", "version": 99}})
+    call(client, cache.apply_change, {"operationType": "update", "documentKey": {"_id": "x"}})
+    assert cache.settings["office_start_time"] == "10:00"
+
+    call(client, server.db.settings.delete_many, {})
+    call(client, cache.apply_change, {"operationType": "delete", "documentKey": {"_id": "x"}})
+    assert cache.settings == {}
+
+
+def test_full_document_is_applied_directly(client, server):
+    cache = server.settings_cache
+    loads = cache.loads
+    call(client, cache.apply_change, {"operationType": "replace", "fullDocument": {"_id": "x", "id": "settings", "version": 7}})
+    assert cache.settings == {"id": "settings", "version": 7}
+    assert cache.loads == loads
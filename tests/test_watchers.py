@@ -0,0 +1,35 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import OperationFailure
+
+
+class BrokenStreams:
+    # watch() fails with an unexpected error first, then reports change streams as unsupported
+    def __init__(self):
+        self.calls = 0
+
+    def watch(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("decoder bug")
+        raise OperationFailure("not a replica set")
+
+
+@pytest.mark.parametrize("watcher, collection", [
+    (lambda server: server.VersionCounters(0), "collection_versions"),
+    (lambda server: server.AttendanceFeed(queue_size=1), "attendance"),
+])
+def test_unexpected_errors_do_not_kill_the_watcher(server, monkeypatch, watcher, collection):
+    streams = BrokenStreams()
+    monkeypatch.setattr(server, "db", SimpleNamespace(**{collection: streams}))
+    sleep = asyncio.sleep
+    monkeypatch.setattr(server.asyncio, "sleep", lambda seconds: sleep(0))
+    instance = watcher(server)
+    instance.watching = True
+
+    asyncio.run(instance.watch())
+    # It retried after the RuntimeError and only stopped on the definitive OperationFailure
+    assert streams.calls == 2
+    assert instance.watching is False